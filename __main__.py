@@ -1,42 +1,62 @@
 if __name__ == "__main__":
-    from icalendar import Calendar, Event, Alarm
-    from datetime import timedelta
-    from modules import load
+    from modules import load, replay, streamRefresh, ListingError
+    from modules.ics import buildCalendar, mergeCalendar
+    from modules.archive import PageArchive
     from modules.nebutil.log import LOGGER
-    from modules.nebutil.time import DateUtil
     from modules.events import EventType
     from argparse import ArgumentParser
     
     PARSER = ArgumentParser(prog="main.py", description="This program generates an ICS calendar file with the Pokémon Go events data scrapped from the https://www.leekduck.com website.")
     PARSER.add_argument("-d", "--downloadImg", help="Download images", action="store_true")
     PARSER.add_argument("-u", "--update", help="Force events to update", action="store_true")
+    PARSER.add_argument("-r", "--replay", help="Parse the events from an archived run (or 'latest') without network access", metavar="RUN", type=str)
+    PARSER.add_argument("-p", "--prune", help="After the refresh, keep only the KEEP most recent archived runs and delete the pages they do not reference", metavar="KEEP", type=int)
+    PARSER.add_argument("-w", "--workers", help="Number of HTML parsing processes (defaults to the number of CPUs, 0 to parse in the main process)", type=int)
+    PARSER.add_argument("-b", "--budget", help="Maximum duration of the refresh in seconds; events not refreshed in time keep their previous content", type=float)
+    PARSER.add_argument("-t", "--request-timeout", help="Maximum duration of each download in seconds, retries included", type=float)
+    PARSER.add_argument("--no-rrule", help="Write each Spotlight Hour and Raid Hour as a separate event instead of weekly recurring events", action="store_true")
+    PARSER.add_argument("-m", "--merge", help="Merge the events into an existing calendar file instead of writing cal.ics, replacing them by UID and keeping everything else as is", metavar="FILE", type=str)
+    PARSER.add_argument("-z", "--zones", help="Also write one calendar per timezone (IANA names, e.g. Europe/Paris) in cal-<zone>.ics", metavar="ZONE", nargs="+", type=str)
+    PARSER.add_argument("-s", "--stream", help="Refresh the events one at a time with a constant memory footprint, writing the data and calendar files as they go", action="store_true")
     ARGS = PARSER.parse_args()
+    if ARGS.stream:
+        # The streamed refresh fetches and writes one event at a time on the main thread, into cal.ics only
+        ignored = [flag for flag,value in (("--workers",ARGS.workers),("--replay",ARGS.replay),("--merge",ARGS.merge),("--zones",ARGS.zones)) if value is not None]
+        if ignored:
+            PARSER.error(f"argument -s/--stream: not allowed with {', '.join(ignored)}")
     
     downloadImg:bool = ARGS.downloadImg
     
-    CAL = Calendar()
     CALENDAR_FILE = 'cal.ics'
-    EVENTS = load(downloadImg)
+    try:
+        if ARGS.stream:
+            streamRefresh(CALENDAR_FILE,downloadImg,budget=ARGS.budget,requestTimeout=ARGS.request_timeout)
+            if ARGS.prune is not None:
+                PageArchive().prune(ARGS.prune)
+            LOGGER.info('Done!')
+            exit(0)
+        EVENTS = replay(ARGS.replay,workers=ARGS.workers)[0] if ARGS.replay else load(downloadImg,ARGS.workers,ARGS.update,ARGS.budget,ARGS.request_timeout)
+    except ListingError as e:
+        LOGGER.error(f"{e} Exiting...")
+        exit(1)
+    if ARGS.prune is not None:
+        PageArchive().prune(ARGS.prune)
     E = EVENTS.ofTypes(EventType.all())
 
+    if ARGS.merge:
+        LOGGER.info(f'Merging {len(E)} events into {ARGS.merge}...')
+        replaced, inserted = mergeCalendar(ARGS.merge,E)
+        LOGGER.info(f'Done! {replaced} replaced, {inserted} inserted.')
+        exit(0)
     LOGGER.info(f'Generating calendar file for {len(E)} events...')
-    for event in E:
-        icsEvent = Event()
-        icsEvent.add('summary', event.name)
-        icsEvent.add('dtstart', DateUtil.fromStr(event.startDate,'%Y-%m-%d %H:%M:%S').date)
-        icsEvent.add('dtend', DateUtil.fromStr(event.endDate,'%Y-%m-%d %H:%M:%S').date)
-        desc = event.contentStr()
-        icsEvent.add('description',desc)
-        alarms = [Alarm() for _ in range(3)]
-        alarms[0].add('trigger',timedelta(minutes=-30))
-        alarms[1].add('trigger',timedelta(hours=-1))
-        alarms[2].add('trigger',timedelta(hours=-3))
-        for alarm in alarms:
-            alarm.add('action','display')
-            icsEvent.add_component(alarm)
-        CAL.add_component(icsEvent)
+    CAL = buildCalendar(E,not ARGS.no_rrule)
 
     LOGGER.info(f'Writing calendar data in {CALENDAR_FILE}...')
     with open(CALENDAR_FILE, 'w') as calendarFile:
         calendarFile.writelines(CAL.to_ical().decode("utf-8"))
+    if ARGS.zones:
+        from modules.zones import ZoneRenderer
+        LOGGER.info(f'Writing calendar data for {len(ARGS.zones)} timezones...')
+        for zone,path in ZoneRenderer(E).write(ARGS.zones).items():
+            LOGGER.info(f'Wrote {zone} calendar in {path}.')
     LOGGER.info('Done!')
@@ -0,0 +1,36 @@
+"""
+Compares the parse throughput of `DateUtil.fromStr` against plain `datetime.strptime`.
+
+Usage: python3 -m benchmarks.dates [-n COUNT]
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from timeit import timeit
+from modules.nebutil.time import DateUtil, PROCESSING_DATE_FORMAT, OUTPUT_DATE_FORMAT
+
+def samples(count:int,distinct:int=300):
+    start = datetime(2023,1,1,10)
+    # A few hundred distinct dates by default, repeated like the event dates of a refresh
+    dates = [start + timedelta(minutes=i) for i in range(min(count,distinct))]
+    output = [d.strftime(OUTPUT_DATE_FORMAT) for d in dates]
+    processing = [d.strftime('%Y-%m-%dT%H:%M:%S') + '+02:00' for d in dates]
+    return [output[i % len(output)] for i in range(count)], [processing[i % len(processing)] for i in range(count)]
+
+def bench(label:str,func,strings,format):
+    elapsed = timeit(lambda: [func(s,format) for s in strings],number=1)
+    print(f"{label:<32} {len(strings) / elapsed:>12,.0f} parses/s")
+
+if __name__ == "__main__":
+    PARSER = ArgumentParser(description="DateUtil parse benchmark")
+    PARSER.add_argument("-n", "--count", help="Number of parses per format", default=100_000, type=int)
+    ARGS = PARSER.parse_args()
+    output, processing = samples(ARGS.count)
+    # Every date distinct, so that the parse cache never hits
+    uniqueOutput, uniqueProcessing = samples(ARGS.count,ARGS.count)
+    for format, strings, unique in ((OUTPUT_DATE_FORMAT,output,uniqueOutput),(PROCESSING_DATE_FORMAT,processing,uniqueProcessing)):
+        print(format)
+        bench("datetime.strptime",datetime.strptime,strings,format)
+        bench("DateUtil.fromStr",DateUtil.fromStr,strings,format)
+        bench("DateUtil.fromStr (distinct)",DateUtil.fromStr,unique,format)
+        bench("DateUtil.fromStr(...).timestamp",lambda s,f: DateUtil.fromStr(s,f).timestamp,strings,format)
+        bench("strptime(...).timestamp()",lambda s,f: datetime.strptime(s,f).timestamp(),strings,format)
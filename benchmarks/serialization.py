@@ -0,0 +1,74 @@
+"""
+Compares saving and reading the data file with the compiled codecs against the previous `json.dump(default=serializer)` / `DataEvent(**kwargs)` path.
+
+Usage: python3 -m benchmarks.serialization [-n COPIES]
+"""
+import io, json
+from argparse import ArgumentParser
+from timeit import timeit
+from modules import readState
+from modules.events import DataEvent, DataEventCollection
+from modules.nebutil.time import DateUtil
+from modules.store import dumpState, parseState
+
+# Attributes of the collection that the previous serializer did not have
+LEGACY_SKIPPED = ('__index','__names')
+
+def unmangle(name:str) -> str:
+    """
+    Removes the `_ClassName__` prefix that Python adds to private attribute names.
+    """
+    if name.startswith('_') and not name.startswith('__'):
+        _, sep, attr = name[1:].partition('__')
+        if sep and attr:
+            return attr
+    return name
+
+def legacySerializer(o):
+    # Previous serializer: every object goes through the json callback and its __dict__
+    return {unmangle(k): v for k,v in o.__dict__.items() if not k.endswith(LEGACY_SKIPPED)}
+
+def legacyDate(date:str):
+    try:
+        return DateUtil.fromStr(date).toStr
+    except ValueError:
+        return DateUtil.fromStr(date,DataEvent.ALTERNATE_DATE_FORMAT).toStr
+
+def legacySave(state) -> str:
+    f = io.StringIO()
+    json.dump({'nextUpdate': state['nextUpdate'],'events': state['events']},f,indent=4,default=legacySerializer)
+    return f.getvalue()
+
+def legacyRead(text:str):
+    data = json.loads(text)
+    items = []
+    for event in data['events']['items']:
+        # Previous constructor: a failing strptime before the alternate format for every stored date
+        event = dict(event,startDate=legacyDate(event['startDate']),endDate=legacyDate(event['endDate']))
+        items.append(DataEvent(**event))
+    return DataEventCollection(items)
+
+def bench(label:str,func,number:int):
+    elapsed = timeit(func,number=number) / number
+    print(f"{label:<24} {elapsed * 1000:>10.1f} ms")
+    return elapsed
+
+if __name__ == "__main__":
+    PARSER = ArgumentParser(description="Data file serialization benchmark")
+    PARSER.add_argument("-n", "--copies", help="Number of copies of the stored events", default=400, type=int)
+    PARSER.add_argument("-r", "--repeat", help="Number of runs per measure", default=3, type=int)
+    ARGS = PARSER.parse_args()
+
+    state = readState()
+    state['events'] = DataEventCollection(list(state['events']) * ARGS.copies)
+    legacyText, text = legacySave(state), dumpState(state)
+    assert [repr(ev) for ev in parseState(text)['events']] == [repr(ev) for ev in state['events']]
+    print(f"{state['events'].size} events")
+    oldSave = bench("legacy save",lambda: legacySave(state),ARGS.repeat)
+    newSave = bench("codec save",lambda: dumpState(state),ARGS.repeat)
+    oldRead = bench("legacy read",lambda: legacyRead(legacyText),ARGS.repeat)
+    newRead = bench("codec read",lambda: parseState(text),ARGS.repeat)
+    packed = DataEventCollection.codec().dumps(state['events'])
+    bench("codec bytes dumps",lambda: DataEventCollection.codec().dumps(state['events']),ARGS.repeat)
+    bench("codec bytes loads",lambda: DataEventCollection.codec().loads(packed),ARGS.repeat)
+    print(f"save x{oldSave / newSave:.1f}, read x{oldRead / newRead:.1f}")
@@ -0,0 +1,81 @@
+"""
+Runs the scraping HTTP client against a local stand-in server that throttles above a request rate and injects latency and failures.
+
+Usage: python3 -m benchmarks.throttling [-n REQUESTS] [-t THREADS] [--limit RATE] [--latency SECONDS] [--fail-rate RATIO]
+"""
+import random, threading, time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.net import HttpClient, TokenBucket
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    HTTP server answering 429 with a `Retry-After` header once clients exceed `limit` requests per second, 503 on a random share of requests, and sleeping up to `latency` seconds before answering.
+    """
+    daemon_threads = True
+
+    def __init__(self,limit:float,latency:float,failRate:float,retryAfter:int=1) -> None:
+        super().__init__(('127.0.0.1',0),StandInHandler)
+        self.bucket = TokenBucket(limit,capacity=limit)
+        self.latency = latency
+        self.failRate = failRate
+        self.retryAfter = retryAfter
+        self.counts = {200: 0, 429: 0, 503: 0}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+    def count(self,status:int):
+        with self.lock:
+            self.counts[status] += 1
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server:StandInServer
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(random.uniform(0,server.latency))
+        if random.random() < server.failRate:
+            status, headers = 503, {}
+        elif not server.bucket.tryAcquire():
+            status, headers = 429, {'Retry-After': str(server.retryAfter)}
+        else:
+            status, headers = 200, {}
+        server.count(status)
+        body = f'<html><body><p>{self.path}</p></body></html>'.encode() if status == 200 else b''
+        self.send_response(status)
+        for k,v in headers.items():
+            self.send_header(k,v)
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,*_):
+        pass
+
+if __name__ == "__main__":
+    PARSER = ArgumentParser(description="Adaptive rate limiter benchmark")
+    PARSER.add_argument("-n", "--requests", help="Number of pages to fetch", default=200, type=int)
+    PARSER.add_argument("-t", "--threads", help="Number of fetching threads", default=8, type=int)
+    PARSER.add_argument("--limit", help="Requests per second above which the server throttles", default=20., type=float)
+    PARSER.add_argument("--latency", help="Maximum injected latency in seconds", default=.05, type=float)
+    PARSER.add_argument("--fail-rate", help="Share of requests failing with 503", default=.02, type=float)
+    ARGS = PARSER.parse_args()
+
+    server = StandInServer(ARGS.limit,ARGS.latency,ARGS.fail_rate)
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    client = HttpClient(retries=6,backoff=.2,maxBackoff=5.,timeout=5.)
+    urls = [f'{server.url}events/{i}/' for i in range(ARGS.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(ARGS.threads) as pool:
+        results = list(pool.map(lambda url: client.get(url).status_code,urls))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"Fetched {results.count(200)}/{len(urls)} pages in {elapsed:.2f}s ({results.count(200) / elapsed:.1f} pages/s, server limit {ARGS.limit}/s)")
+    print(f"Server answers: {server.counts}")
+    print(f"Final client rate: {client.limiter(server.url).rate:.2f} requests/s")
@@ -0,0 +1,58 @@
+"""
+Compares rendering one calendar per timezone with `ZoneRenderer` against building each calendar with icalendar and `zoneinfo` conversions.
+
+Usage: python3 -m benchmarks.zones [-z ZONES] [-n COPIES]
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from time import perf_counter
+from zoneinfo import ZoneInfo, available_timezones
+from icalendar import Calendar
+from modules import read
+from modules.events import DataEventCollection
+from modules.ics import icsEvent, eventStart, eventEnd
+from modules.zones import ZoneRenderer
+
+def naiveRender(events,zone:str) -> bytes:
+    tz = ZoneInfo(zone)
+    calendar = Calendar()
+    calendar.add('prodid','-//pokemongo-calendar//LeekDuck events//EN')
+    calendar.add('version','2.0')
+    for event in events:
+        component = icsEvent(event)
+        if event.localtime:
+            start, end = eventStart(event).replace(tzinfo=tz), eventEnd(event).replace(tzinfo=tz)
+        else:
+            start, end = datetime.fromtimestamp(event.startDateTimestamp,tz), datetime.fromtimestamp(event.endDateTimestamp,tz)
+        del component['dtstart']
+        del component['dtend']
+        component.add('dtstart',start)
+        component.add('dtend',end)
+        calendar.add_component(component)
+    return calendar.to_ical()
+
+def timed(func):
+    start = perf_counter()
+    func()
+    return perf_counter() - start
+
+if __name__ == "__main__":
+    PARSER = ArgumentParser(description="Per-timezone calendar rendering benchmark")
+    PARSER.add_argument("-z", "--zones", help="Number of timezones", default=40, type=int)
+    PARSER.add_argument("-n", "--copies", help="Number of copies of the stored events", default=20, type=int)
+    ARGS = PARSER.parse_args()
+
+    events = DataEventCollection(list(read()[0]) * ARGS.copies)
+    zones = sorted(zone for zone in available_timezones() if '/' in zone and not zone.startswith('Etc'))[::7][:ARGS.zones]
+    print(f"{events.size} events, {len(zones)} timezones")
+    start = perf_counter()
+    renderer = ZoneRenderer(events)
+    prepare = perf_counter() - start
+    one = timed(lambda: renderer.render(zones[0]))
+    many = timed(lambda: [renderer.render(zone) for zone in zones])
+    naive = timed(lambda: [naiveRender(events,zone) for zone in zones])
+    print(f"{'prepare':<28} {prepare * 1000:>10.1f} ms")
+    print(f"{'render 1 zone':<28} {one * 1000:>10.1f} ms")
+    print(f"{f'render {len(zones)} zones':<28} {many * 1000:>10.1f} ms")
+    print(f"{f'icalendar {len(zones)} zones':<28} {naive * 1000:>10.1f} ms")
+    print(f"{len(zones)} zones cost x{(prepare + many) / (prepare + one):.2f} one zone, x{naive / (prepare + many):.1f} faster than icalendar")
@@ -2,8 +2,61 @@ from argparse import ArgumentParser
 PARSER = ArgumentParser(description="This program generates an ICS calendar file with the Pokémon Go events data scrapped from the https://www.leekduck.com website. Note that the usage of the website's data is not for commercial purposes and the usage of this program must not be either.")
 PARSER.add_argument("-d", "--downloadImg", help="Downloads images", action="store_true")
 PARSER.add_argument("-u", "--update", help="Forces update", action="store_true")
-PARSER.add_argument("-o", "--output", help="Output file name", default="cal.ics",type=str)
+PARSER.add_argument("-o", "--output", help="Output file name (standard output if not set for queries)", type=str)
 PARSER.add_argument("-v", "--verbose", help="Verbose mode", action="store_true")
 PARSER.add_argument("-q", "--quiet", help="Quiet mode", action="store_true")
+COMMANDS = PARSER.add_subparsers(dest="command")
+QUERY = COMMANDS.add_parser("query", help="Queries the locally stored events, without network access")
+QUERY.add_argument("-t", "--type", help="Event type, e.g. RAID_BATTLES (repeatable)", action="append", dest="types", type=str.upper)
+QUERY.add_argument("-p", "--pokemon", help="Featured Pokémon, e.g. DARKRAI (repeatable)", action="append", dest="pokemons", type=str.upper)
+QUERY.add_argument("--all", help="Events must feature every given Pokémon", action="store_true", dest="strict")
+QUERY.add_argument("-n", "--name", help="Substring of the event name, case insensitive", type=str)
+QUERY.add_argument("--after", help="Events still running at this date (YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS')", type=str)
+QUERY.add_argument("--before", help="Events starting before this date (YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS')", type=str)
+QUERY.add_argument("--upcoming", help="Only events that have not ended yet", action="store_true")
+QUERY.add_argument("-f", "--format", help="Output format", choices=["table","json","ics"], default="table")
 ARGS = PARSER.parse_args()
-print(ARGS)
\ No newline at end of file
+
+if __name__ == "__main__":
+    import logging
+    from modules.nebutil.log import LOGGER
+    LOGGER.setLevel(logging.DEBUG if ARGS.verbose else logging.WARNING if ARGS.quiet or ARGS.command == "query" else logging.INFO)
+    
+    if ARGS.command != "query":
+        PARSER.print_help()
+        exit(0)
+    
+    import json, sys
+    from modules import read
+    from modules.nebutil import serializer
+    from modules.nebutil.time import DateUtil
+    
+    def timestamp(s):
+        if s is None:
+            return None
+        try:
+            return DateUtil.fromStr(s,'%Y-%m-%d %H:%M:%S').timestamp
+        except ValueError:
+            return DateUtil.fromStr(s,'%Y-%m-%d').timestamp
+    
+    after = timestamp(ARGS.after)
+    if ARGS.upcoming:
+        after = max(after or 0.,DateUtil.now().timestamp)
+    EVENTS = read()[0].query(ARGS.types,ARGS.pokemons,ARGS.name,after,timestamp(ARGS.before),ARGS.strict)
+    
+    if ARGS.format == "json":
+        out = json.dumps(EVENTS.items,indent=4,default=serializer,ensure_ascii=False) + "\n"
+    elif ARGS.format == "ics":
+        from modules.ics import buildCalendar
+        out = buildCalendar(EVENTS).to_ical().decode("utf-8")
+    else:
+        rows = [(ev.startDate,ev.endDate,ev.eventType,ev.name,", ".join(ev.content.get('featuredPokemons',[]))) for ev in EVENTS]
+        header = ("START","END","TYPE","NAME","POKÉMON")
+        widths = [max(len(str(row[i])) for row in rows + [header]) for i in range(len(header))]
+        out = "".join("  ".join(str(v).ljust(w) for v,w in zip(row,widths)).rstrip() + "\n" for row in [header] + rows)
+    
+    if ARGS.output:
+        with open(ARGS.output,'w',newline='' if ARGS.format == "ics" else None) as f:
+            f.write(out)
+    else:
+        sys.stdout.write(out)
@@ -1,16 +1,37 @@
-import requests, json, os
+import os
 from bs4 import BeautifulSoup
 from .nebutil.time import DateUtil
 from .nebutil.log import LOGGER
-from .nebutil import serializer
-from .events import DataEvent as Event, DataEventCollection as EventCollection, URL
+from .events import DataEvent as Event, DataEventCollection as EventCollection, EventType, URL, fetchPage
+from .net import Deadline
+from .archive import PageArchive
+from .pipeline import ParsePool
+from .changes import ChangeLog, diff
+from .stream import CalendarWriter, iterEvents, peakRss, currentRss, formatBytes
+from .freshness import RefreshPolicy, checked
+from .store import EventStore
+from typing import Any, Callable, Dict, Optional
 
 DATA_FILE = "events.json"
 
-def getData(downloadImgs=True):
-    response = requests.get(URL).text
-    LOGGER.info(f"Succesfully downloaded {URL} content.")
-    soup = BeautifulSoup(response, 'html5lib')
+class ListingError(Exception):
+    """
+    Raised when the events listing page cannot be parsed.
+    """
+
+def parseListing(page:bytes,now:Optional[float]=None):
+    """
+    Parses the events listing page.
+    
+    :param page: The raw bytes of the listing page.
+    :type page: `bytes`
+    :param now: The timestamp before which ended events are skipped, e.g. the time of an archived run. Defaults to now.
+    :type now: `Optional[float]`
+    :return: The headers of the listed events, as returned by `DataEvent.headerFromSoup`.
+    :rtype: `list[Dict[str,Any]]`
+    :raises ListingError: if the page does not have the expected sections.
+    """
+    soup = BeautifulSoup(page, 'html5lib')
     
     eventsDiv = {
         'current': soup.select_one("body div.page-content div.current-events"),
@@ -18,29 +39,60 @@ def getData(downloadImgs=True):
     }
     
     if eventsDiv['current'] is None or eventsDiv['upcoming'] is None:
-        LOGGER.error("Error while parsing HTML. Exiting...")
-        exit(1)
+        soup.decompose()
+        raise ListingError("Error while parsing HTML: the current or upcoming events section is missing.")
         
     EVENT_WRAPPER_CLASS = 'span.event-header-item-wrapper'
     currentEventsLength = len(eventsDiv['current'].select(EVENT_WRAPPER_CLASS))
     upcomingEventsLength = len(eventsDiv['upcoming'].select(EVENT_WRAPPER_CLASS))
     LOGGER.info(f"Processing {currentEventsLength} current events and {upcomingEventsLength} upcoming events...")
     
-    events = []
+    headers = []
     for k,v in eventsDiv.items():
         if v is not None:
-            eventSet = v.select('span.event-header-item-wrapper')
-            for index,event in enumerate(eventSet):
-                event = Event.fromSoup(k,event)
-                if event:
-                    events.append(event)
+            eventSet = v.select(EVENT_WRAPPER_CLASS)
+            for event in eventSet:
+                header = Event.headerFromSoup(k,event,now)
+                if header:
+                    headers.append(header)
+    soup.decompose()
+    return headers
+
+def fetchListing(fetch:Callable[[str],bytes]=fetchPage,now:Optional[float]=None):
+    """
+    Downloads and parses the events listing page.
+    
+    :param fetch: The function downloading the raw bytes of a URL.
+    :type fetch: `Callable[[str],bytes]`
+    :param now: The timestamp before which ended events are skipped, see `parseListing`.
+    :type now: `Optional[float]`
+    :return: The headers of the listed events, see `parseListing`.
+    :rtype: `list[Dict[str,Any]]`
+    :raises ListingError: if the page cannot be downloaded or parsed.
+    """
+    try:
+        response = fetch(URL)
+    except Exception as e:
+        raise ListingError(f"Could not download {URL}: {e.__class__.__name__}: {e}.") from e
+    LOGGER.info(f"Succesfully downloaded {URL} content.")
+    return parseListing(response,now)
+
+def getData(downloadImgs=True,fetch:Callable[[str],bytes]=fetchPage,workers:Optional[int]=None,now:Optional[float]=None):
+    now = DateUtil.now().timestamp if now is None else now
+    # The parsing processes warm up while the listing is downloaded and parsed
+    with ParsePool(workers) as pool:
+        headers = fetchListing(fetch,now)
+        fetched, failed = pool.collect(headers,fetch)
+    for url,reason in failed.items():
+        LOGGER.warning(f"Skipping {url}: {reason}")
+    events = [fetched[header['url']] for header in headers if header['url'] in fetched]
     
     LOGGER.info(f"Successfully processed {len(events)} events.")
     events = EventCollection(events)
     if downloadImgs:
         path = os.path.join(os.getcwd(),'assets')
         events.downloadImgs(path)
-    nextUpdate:float = min([ev.startDateTimestamp for ev in events.upcoming() if ev.startDateTimestamp])
+    nextUpdate:float = min([ev.startDateTimestamp for ev in events if ev.startDateTimestamp > now],default=now)
     return events, nextUpdate
     
 def removePastEvents(events:EventCollection):
@@ -52,49 +104,267 @@ def removePastEvents(events:EventCollection):
         LOGGER.info(f"Removed past events. {events.size} events remaining.")
     return events
 
-def save(events,nextUpdate):
+def save(events,nextUpdate,previous:Optional[EventCollection]=None,changeLog:Optional[ChangeLog]=None,freshness:Optional[Dict[str,Dict[str,Any]]]=None,listingChecked:Optional[float]=None,store:Optional[EventStore]=None):
+    """
+    Saves the events and logs the changes since the previously saved state.
+    Only the changes are written, to the journal of the store.
+    
+    :param events: The events to save.
+    :type events: `EventCollection`
+    :param nextUpdate: The timestamp of the next update.
+    :type nextUpdate: `float`
+    :param previous: The previously saved events. Read from the store if not provided.
+    :type previous: `Optional[EventCollection]`
+    :param changeLog: The log to append the changes to. Defaults to the `changes.jsonl` file.
+    :type changeLog: `Optional[ChangeLog]`
+    :param freshness: The freshness records of the events by URL, see `update`.
+    :type freshness: `Optional[Dict[str,Dict[str,Any]]]`
+    :param listingChecked: The timestamp of the last fetch of the listing.
+    :type listingChecked: `Optional[float]`
+    :param store: The store to save the events in. Defaults to the data file.
+    :type store: `Optional[EventStore]`
+    :return: `1` on success, `0` otherwise.
+    :rtype: `int`
+    """
+    store = store or EventStore(DATA_FILE)
+    if previous is None:
+        try:
+            previous = store.read()['events'] if store.exists() else EventCollection([])
+        except Exception as e:
+            LOGGER.warning(f"Could not read the previous data, changes will not be logged: {e}")
     try:
-        with open(DATA_FILE,'w') as f:
-            events = removePastEvents(events)
-            LOGGER.info(f"Next update: {DateUtil.fromTimestamp(nextUpdate)}")
-            events = events.sort(lambda ev: ev.startDateTimestamp,False)
-            json.dump({
-                'nextUpdate': nextUpdate,
-                'events': events
-            },f,indent=4,default=serializer)
-            LOGGER.info(f"Saved {events.size} events.")
-        return 1
+        events = removePastEvents(events)
+        LOGGER.info(f"Next update: {DateUtil.fromTimestamp(nextUpdate)}")
+        events = events.sort(lambda ev: ev.startDateTimestamp,False)
+        store.commit({
+            'nextUpdate': nextUpdate,
+            'listingChecked': listingChecked,
+            'freshness': freshness or {},
+            'events': events
+        })
+        LOGGER.info(f"Saved {events.size} events.")
     except Exception as e:
         LOGGER.error(f"Error while saving data: {e} - {e.__traceback__}")
         return 0
+    if previous is not None:
+        (changeLog or ChangeLog()).append(diff(previous,events))
+    return 1
+    
+def changes(since:Optional[float]=None,kinds=None,changeLog:Optional[ChangeLog]=None):
+    """
+    Returns the changes logged between refreshes.
+    
+    :param since: Only return the changes logged at or after this timestamp.
+    :type since: `Optional[float]`
+    :param kinds: Only return the changes of these kinds, see `ChangeKind`.
+    :type kinds: `Optional[Iterable[str]]`
+    :param changeLog: The log to read. Defaults to the `changes.jsonl` file.
+    :type changeLog: `Optional[ChangeLog]`
+    :return: The changes, oldest first.
+    :rtype: `list[Dict[str,Any]]`
+    """
+    return list((changeLog or ChangeLog()).read(since,kinds))
+
+def readState(store:Optional[EventStore]=None):
+    """
+    Reads the data file and its journal.
     
+    :param store: The store to read. Defaults to the data file.
+    :type store: `Optional[EventStore]`
+    :return: The saved state, with the `events`, the `nextUpdate` timestamp, the `freshness` records of the events by URL and the `listingChecked` timestamp.
+    :rtype: `Dict[str,Any]`
+    """
+    return (store or EventStore(DATA_FILE)).read()
+
 def read():
-    events = None
-    nextUpdate = 0.
-    with open(DATA_FILE,'r') as f:
-        data = json.loads(f.read())
-        eventsData = data['events']['items']
-        nextUpdate:float = data['nextUpdate']
-        events = EventCollection([Event(**event) for event in eventsData])
-    return events, nextUpdate
+    state = readState()
+    return state['events'], state['nextUpdate']
+
+def replay(run:str='latest',archive:Optional[PageArchive]=None,workers:Optional[int]=None):
+    """
+    Parses the events from an archived run, without any network access.
+    Ended events are skipped as of the time of the run rather than now, so that replaying a run always gives the same events.
+    
+    :param run: The identifier of the run to replay, or `latest`.
+    :type run: `str`
+    :param archive: The archive to read the run from. Defaults to the `archive` directory.
+    :type archive: `Optional[PageArchive]`
+    :param workers: The number of parsing processes. Defaults to the number of CPUs.
+    :type workers: `Optional[int]`
+    :return: The events and the timestamp of the next update.
+    :rtype: `tuple[EventCollection,float]`
+    """
+    archive = archive or PageArchive()
+    run = archive.resolve(run)
+    return getData(False,archive.replayer(run),workers,archive.runTimestamp(run))
+
+def update(state:Optional[Dict[str,Any]]=None,downloadImages=True,archive:Optional[PageArchive]=None,workers:Optional[int]=None,policy:Optional[RefreshPolicy]=None,force=False,budget:Optional[float]=None,requestTimeout:Optional[float]=None):
+    """
+    Refreshes only what is due according to the refresh policy.
+    
+    The listing is fetched when its own interval has passed; otherwise the known events are kept as listed. Only the events that are new or due are fetched, the others keep their previously stored content.
+    Each fetched event gets a freshness record with the time of the check, the hash of the event and the number of consecutive checks that found it unchanged.
+    
+    The refresh always returns by the end of its time budget. Events whose page fails, cannot be parsed or is not done in time are stale: they keep their previously stored content (empty for new events) and their freshness record, so they are due again at the next refresh.
+    If the listing cannot be fetched or parsed, the known events are kept as listed, or `ListingError` is raised when there are none.
+    
+    :param state: The previously saved state, as returned by `readState`. `None` refreshes everything.
+    :type state: `Optional[Dict[str,Any]]`
+    :param downloadImages: Whether to download the images of the fetched events.
+    :type downloadImages: `bool`
+    :param archive: The archive to record the fetched pages in. Defaults to the `archive` directory.
+    :type archive: `Optional[PageArchive]`
+    :param workers: The number of parsing processes. Defaults to the number of CPUs.
+    :type workers: `Optional[int]`
+    :param policy: The refresh policy. Defaults to `RefreshPolicy()`.
+    :type policy: `Optional[RefreshPolicy]`
+    :param force: Whether to fetch the listing and every event regardless of the policy.
+    :type force: `bool`
+    :param budget: The number of seconds allowed for the whole refresh. Unlimited if `None`.
+    :type budget: `Optional[float]`
+    :param requestTimeout: The number of seconds allowed for each download, retries included. Only bounded by the budget if `None`.
+    :type requestTimeout: `Optional[float]`
+    :return: The new state, in the format of `readState`, with the reason of each `stale` event by URL. `nextUpdate` is the time of the earliest due check.
+    :rtype: `Dict[str,Any]`
+    :raises ListingError: if there is no known event and the listing cannot be fetched or parsed.
+    """
+    policy = policy or RefreshPolicy()
+    archive = archive or PageArchive()
+    deadline = Deadline(budget)
+    fetch = archive.fetcher(lambda url: fetchPage(url,deadline.within(requestTimeout)))
+    state = state or {}
+    now = DateUtil.now().timestamp
+    previous = {ev.url: ev for ev in state.get('events') or []}
+    freshness = dict(state.get('freshness') or {})
+    listingChecked = state.get('listingChecked')
+    # Parsing processes are only spawned for the events that are due, often none
+    with ParsePool(workers,warm=False) as pool:
+        headers = None
+        if force or not previous or policy.listingDue(listingChecked,now):
+            try:
+                headers = fetchListing(fetch)
+                listingChecked = now
+            except ListingError as e:
+                if not previous:
+                    raise
+                LOGGER.warning(f"Could not refresh the listing, keeping the known events: {e}")
+        if headers is None:
+            headers = [ev.header for ev in previous.values() if ev.endDateTimestamp >= now]
+        due = [header for header in headers if force or header['url'] not in previous or policy.due(previous[header['url']],freshness.get(header['url']),now)]
+        LOGGER.info(f"{len(due)} of {len(headers)} events are due for a refresh.")
+        fetched, stale = pool.collect(due,fetch,deadline)
+    # The pages that were not due are carried from the previous run, so that the run replays the whole state
+    archive.commit(carry=[URL] + [header['url'] for header in headers])
+    
+    events = []
+    for header in headers:
+        url = header['url']
+        if url in fetched:
+            events.append(fetched[url])
+            freshness[url] = checked(fetched[url],freshness.get(url),now)
+        else:
+            events.append(Event(content=previous[url].content if url in previous else {},**header))
+    events = EventCollection(events)
+    for url,reason in stale.items():
+        LOGGER.warning(f"Stale: {url} ({reason}), " + ("keeping its previous content." if url in previous else "listed without content."))
+    if downloadImages:
+        EventCollection(fetched.values()).downloadImgs(os.path.join(os.getcwd(),'assets'),deadline,requestTimeout)
+    nextUpdate = min([(listingChecked or now) + policy.listingInterval] + [policy.nextCheck(ev,freshness.get(ev.url),now) for ev in events])
+    return {
+        'events': events,
+        'nextUpdate': nextUpdate,
+        'freshness': {ev.url: freshness[ev.url] for ev in events if ev.url in freshness},
+        'listingChecked': listingChecked,
+        'stale': stale
+    }
+
+def streamRefresh(calendarFile:str,downloadImages=False,archive:Optional[PageArchive]=None,dataFile:str=DATA_FILE,policy:Optional[RefreshPolicy]=None,budget:Optional[float]=None,requestTimeout:Optional[float]=None):
+    """
+    Refreshes the events with a constant memory footprint: each event is fetched, parsed, journaled and written to the calendar before the next one, and never kept afterwards.
+    Every event is fetched and gets a freshness record, as with a forced `update`. The commit goes through the event store journal, which is only closed once the whole refresh is done, like the calendar file is only replaced then.
+    As with `update`, events whose page fails, cannot be parsed or is not done by the end of the time budget are stale: they keep their stored content and freshness record (empty content for new events).
+    No change is logged, since it requires every event at once, and the weekly series of the calendar are not compressed.
+    
+    :param calendarFile: The path of the calendar file to write.
+    :type calendarFile: `str`
+    :param downloadImages: Whether to download the images of the events.
+    :type downloadImages: `bool`
+    :param archive: The archive to record the fetched pages in. Defaults to the `archive` directory.
+    :type archive: `Optional[PageArchive]`
+    :param dataFile: The path of the data file of the event store.
+    :type dataFile: `str`
+    :param policy: The refresh policy giving the timestamp of the next update. Defaults to `RefreshPolicy()`.
+    :type policy: `Optional[RefreshPolicy]`
+    :param budget: The number of seconds allowed for the whole refresh. Unlimited if `None`.
+    :type budget: `Optional[float]`
+    :param requestTimeout: The number of seconds allowed for each download, retries included. Only bounded by the budget if `None`.
+    :type requestTimeout: `Optional[float]`
+    :return: The number of events and the timestamp of the next update.
+    :rtype: `tuple[int,float]`
+    :raises ListingError: if the listing cannot be fetched or parsed.
+    """
+    policy = policy or RefreshPolicy()
+    archive = archive or PageArchive()
+    deadline = Deadline(budget)
+    fetch = archive.fetcher(lambda url: fetchPage(url,deadline.within(requestTimeout)))
+    headers = fetchListing(fetch)
+    LOGGER.info(f"Listing parsed, RSS: {formatBytes(currentRss())}.")
+    now = DateUtil.now().timestamp
+    nextUpdate = now + policy.listingInterval
+    types = EventType.all()
+    imgPath = os.path.join(os.getcwd(),'assets')
+    count = stale = 0
+    with EventStore(dataFile).begin() as store, CalendarWriter(calendarFile) as calendar:
+        for header, event, reason in iterEvents(headers,fetch,deadline):
+            if event is None:
+                stale += 1
+                event = store.keep(header['url'])
+                LOGGER.warning(f"Stale: {header['url']} ({reason}), " + ("keeping its previous content." if event else "listed without content."))
+                if event is None:
+                    event = Event(content={},**header)
+                    store.write(event)
+                record = store.record(event.url)
+            else:
+                record = checked(event,store.record(event.url),now)
+                store.write(event,record)
+                if downloadImages and not deadline.expired:
+                    try:
+                        event.downloadImg(imgPath,deadline.within(requestTimeout))
+                    except Exception as e:
+                        LOGGER.warning(f"Could not download {event.imgUrl}: {e}")
+            # The same events as the calendar of the normal refresh
+            if event.eventType in types:
+                calendar.write(event)
+            nextUpdate = min(nextUpdate,policy.nextCheck(event,record,now))
+            count += 1
+            if count % 25 == 0:
+                LOGGER.info(f"Processed {count}/{len(headers)} events, RSS: {formatBytes(currentRss())}.")
+        calendar.finish()
+        store.finish(nextUpdate,now)
+    archive.commit(carry=[header['url'] for header in headers])
+    LOGGER.info(f"Streamed {count} events" + (f", {stale} stale" if stale else "") + f". Peak RSS: {formatBytes(peakRss())}.")
+    return count, nextUpdate
 
-def load(downloadImages=True):
-    if os.path.exists(DATA_FILE) and os.path.getsize(DATA_FILE) > 0:
-        events, nextUpdate = read()
+def load(downloadImages=True,workers:Optional[int]=None,force=False,budget:Optional[float]=None,requestTimeout:Optional[float]=None):
+    store = EventStore(DATA_FILE)
+    if store.exists():
+        state = readState(store)
+        events, nextUpdate = state['events'], state['nextUpdate']
         LOGGER.info('Data file found. Reading...')
         now = DateUtil.now().timestamp
-        if nextUpdate < now:
+        if force or nextUpdate < now:
             LOGGER.info("File data is outdated. Updating...")
-            events,nextUpdate = getData(downloadImages)
-            save(events,nextUpdate)
-            events = read()[0]
+            state = update(state,downloadImages,workers=workers,force=force,budget=budget,requestTimeout=requestTimeout)
+            save(state['events'],state['nextUpdate'],events,freshness=state['freshness'],listingChecked=state['listingChecked'],store=store)
+            events = readState(store)['events']
         else:
             LOGGER.info("File data is up to date.")
             LOGGER.info(f"Next update: {DateUtil.fromTimestamp(nextUpdate)}")
         events = removePastEvents(events)
     else:
         LOGGER.info('Data file not found. Downloading...')
-        events,nextUpdate = getData(downloadImages)
-        save(events,nextUpdate)
+        state = update(None,downloadImages,workers=workers,budget=budget,requestTimeout=requestTimeout)
+        events = state['events']
+        save(events,state['nextUpdate'],freshness=state['freshness'],listingChecked=state['listingChecked'],store=store)
     LOGGER.info(f"Found {events.size} events.")
-    return events
+    return events
\ No newline at end of file
@@ -0,0 +1,222 @@
+import gzip, hashlib, json, os, threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from ..nebutil.time import DateUtil
+from ..nebutil.log import LOGGER
+
+ARCHIVE_DIR = "archive"
+RUN_DATE_FORMAT = '%Y%m%dT%H%M%S'
+
+class PageArchive:
+    """
+    Content-addressed archive of fetched pages.
+
+    Each page is stored once, gzip-compressed, under `objects/<hash[:2]>/<hash>.gz` where `hash` is the SHA-256 of the raw bytes.
+    Every refresh writes a manifest in `runs/<run>.json` mapping each fetched URL to its object hash, so a run can be replayed offline. Incremental refreshes also carry the pages they did not need to fetch from the previous run.
+
+    :param path: The root directory of the archive.
+    :type path: `str`
+    """
+
+    def __init__(self,path:str=ARCHIVE_DIR) -> None:
+        self.__path = path
+        self.__pages:Dict[str,str] = {}
+        self.__lock = threading.Lock()
+        self.__run = DateUtil.now().date.strftime(RUN_DATE_FORMAT)
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def run(self):
+        return self.__run
+
+    def objectPath(self,digest:str):
+        return os.path.join(self.__path,'objects',digest[:2],f'{digest}.gz')
+
+    def manifestPath(self,run:str):
+        return os.path.join(self.__path,'runs',f'{run}.json')
+
+    def put(self,content:bytes):
+        """
+        Stores raw content in the archive if it is not already present.
+
+        :param content: The raw bytes to store.
+        :type content: `bytes`
+        :return: The SHA-256 hex digest addressing the content.
+        :rtype: `str`
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        target = self.objectPath(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target),exist_ok=True)
+            tmp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with gzip.open(tmp,'wb') as f:
+                f.write(content)
+            os.replace(tmp,target)
+        return digest
+
+    def get(self,digest:str):
+        """
+        Reads raw content from the archive.
+
+        :param digest: The SHA-256 hex digest of the content.
+        :type digest: `str`
+        :return: The raw bytes.
+        :rtype: `bytes`
+        """
+        with gzip.open(self.objectPath(digest),'rb') as f:
+            return f.read()
+
+    def record(self,url:str,content:bytes):
+        """
+        Stores a fetched page and registers it in the manifest of the current run.
+
+        :param url: The URL the page was fetched from.
+        :type url: `str`
+        :param content: The raw bytes of the page.
+        :type content: `bytes`
+        :return: The raw bytes, unchanged.
+        :rtype: `bytes`
+        """
+        digest = self.put(content)
+        with self.__lock:
+            self.__pages[url] = digest
+        return content
+
+    def fetcher(self,fetch:Callable[[str],bytes]):
+        """
+        Wraps a fetch function so that every fetched page is recorded in the archive.
+
+        :param fetch: The function downloading the raw bytes of a URL.
+        :type fetch: `Callable[[str],bytes]`
+        :return: A recording fetch function.
+        :rtype: `Callable[[str],bytes]`
+        """
+        return lambda url: self.record(url,fetch(url))
+
+    def commit(self,carry:Optional[Iterable[str]]=None):
+        """
+        Writes the manifest of the current run.
+
+        :param carry: URLs that may not have been fetched during this run. Those that were not are taken from the manifest of the latest previous run, if they are in it.
+        :type carry: `Optional[Iterable[str]]`
+        :return: The identifier of the run.
+        :rtype: `str`
+        """
+        target = self.manifestPath(self.__run)
+        os.makedirs(os.path.dirname(target),exist_ok=True)
+        with self.__lock:
+            pages = dict(self.__pages)
+        carried = 0
+        if carry is not None:
+            previous = [run for run in self.runs() if run != self.__run]
+            previousPages = self.manifest(previous[-1]) if previous else {}
+            for url in carry:
+                if url not in pages and url in previousPages:
+                    pages[url] = previousPages[url]
+                    carried += 1
+        manifest = {'run': self.__run, 'pages': pages}
+        with open(target,'w') as f:
+            json.dump(manifest,f,indent=4)
+        LOGGER.info(f"Archived {len(pages) - carried} pages in run {self.__run}" + (f", {carried} carried from the previous run." if carried else "."))
+        return self.__run
+
+    def runs(self) -> List[str]:
+        """
+        Returns the identifiers of the archived runs, oldest first.
+
+        :rtype: `list[str]`
+        """
+        runsDir = os.path.join(self.__path,'runs')
+        if not os.path.isdir(runsDir):
+            return []
+        return sorted(f[:-len('.json')] for f in os.listdir(runsDir) if f.endswith('.json'))
+
+    def resolve(self,run:str) -> str:
+        """
+        Returns the identifier of a run, resolving `latest` to the most recent one.
+
+        :param run: The identifier of the run, or `latest`.
+        :type run: `str`
+        :rtype: `str`
+        :raises FileNotFoundError: if `latest` is asked and no run was archived.
+        """
+        if run != 'latest':
+            return run
+        runs = self.runs()
+        if not runs:
+            raise FileNotFoundError(f"No archived run in {self.__path}")
+        return runs[-1]
+
+    def runTimestamp(self,run:str) -> float:
+        """
+        Returns the time at which a run was made, from its identifier.
+
+        :param run: The identifier of the run, or `latest`.
+        :type run: `str`
+        :rtype: `float`
+        """
+        return datetime.strptime(self.resolve(run),RUN_DATE_FORMAT).timestamp()
+
+    def manifest(self,run:str) -> Dict[str,str]:
+        """
+        Reads the manifest of a run.
+
+        :param run: The identifier of the run, or `latest`.
+        :type run: `str`
+        :return: The mapping of URLs to object digests.
+        :rtype: `Dict[str,str]`
+        """
+        with open(self.manifestPath(self.resolve(run)),'r') as f:
+            return json.load(f)['pages']
+
+    def replayer(self,run:str):
+        """
+        Returns a fetch function serving pages from an archived run, without any network access.
+
+        :param run: The identifier of the run, or `latest`.
+        :type run: `str`
+        :return: A fetch function raising `KeyError` for URLs that were not archived in the run.
+        :rtype: `Callable[[str],bytes]`
+        """
+        pages = self.manifest(run)
+        LOGGER.info(f"Replaying {len(pages)} archived pages.")
+        def fetch(url:str) -> bytes:
+            if url not in pages:
+                raise KeyError(f"{url} is not archived in run {run}")
+            return self.get(pages[url])
+        return fetch
+
+    def prune(self,keep:int=10) -> Tuple[int,int]:
+        """
+        Deletes the manifests of every run but the `keep` newest ones, then the objects that no remaining manifest references.
+        The pages recorded by the current run and not committed yet are kept.
+
+        :param keep: The number of runs to keep.
+        :type keep: `int`
+        :return: The number of deleted runs and of deleted objects.
+        :rtype: `tuple[int,int]`
+        """
+        runs = self.runs()
+        dropped = runs[:max(len(runs) - keep,0)]
+        for run in dropped:
+            os.remove(self.manifestPath(run))
+        with self.__lock:
+            referenced = set(self.__pages.values())
+        for run in runs[len(dropped):]:
+            referenced.update(self.manifest(run).values())
+        deleted = 0
+        objectsDir = os.path.join(self.__path,'objects')
+        for prefix in (os.listdir(objectsDir) if os.path.isdir(objectsDir) else []):
+            directory = os.path.join(objectsDir,prefix)
+            # Temporary files of pages being written are left alone
+            for name in os.listdir(directory):
+                if name.endswith('.gz') and name[:-len('.gz')] not in referenced:
+                    os.remove(os.path.join(directory,name))
+                    deleted += 1
+            if not os.listdir(directory):
+                os.rmdir(directory)
+        LOGGER.info(f"Pruned {len(dropped)} runs and {deleted} pages from {self.__path}.")
+        return len(dropped), deleted
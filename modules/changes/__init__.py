@@ -0,0 +1,146 @@
+import hashlib, json, os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from ..nebutil.time import DateUtil
+from ..nebutil.log import LOGGER
+
+CHANGES_FILE = "changes.jsonl"
+
+class ChangeKind:
+    ADDED = 'ADDED'
+    REMOVED = 'REMOVED'
+    EXPIRED = 'EXPIRED'
+    RESCHEDULED = 'RESCHEDULED'
+    UPDATED = 'UPDATED'
+
+SCHEDULE_FIELDS = ('startDate','endDate','localtime')
+DETAIL_FIELDS = ('name','eventType','imgUrl')
+
+def eventDigest(event) -> str:
+    """
+    Computes a hash of every field of an event.
+
+    :param event: The event to hash.
+    :type event: `DataEvent`
+    :return: The SHA-1 hex digest of the event.
+    :rtype: `str`
+    """
+    fields = [event.name,event.startDate,event.endDate,event.localtime,event.eventType,event.content,event.url,event.imgUrl]
+    return hashlib.sha1(json.dumps(fields,sort_keys=True,ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _change(kind:str,event,now:float,before:Optional[Dict[str,Any]]=None,after:Optional[Dict[str,Any]]=None) -> Dict[str,Any]:
+    return {
+        'time': now,
+        'kind': kind,
+        'url': event.url,
+        'name': event.name,
+        'eventType': event.eventType,
+        'hash': eventDigest(event),
+        'before': before or {},
+        'after': after or {}
+    }
+
+def diff(previous:Iterable,current:Iterable,now:Optional[float]=None) -> List[Dict[str,Any]]:
+    """
+    Computes the changes between two states of the events, keyed by event URL.
+
+    New events are `ADDED`, missing ones `REMOVED` (or `EXPIRED` if they have ended).
+    Events whose dates changed are `RESCHEDULED`, and events whose name, type, image or content changed are `UPDATED`, with only the changed fields and content keys in `before`/`after`.
+    Events whose hashes are equal are skipped without comparing their fields.
+
+    :param previous: The previous events.
+    :type previous: `Iterable[DataEvent]`
+    :param current: The current events.
+    :type current: `Iterable[DataEvent]`
+    :param now: The timestamp of the changes. Defaults to now.
+    :type now: `Optional[float]`
+    :return: The changes, in the order of `current` then `previous`.
+    :rtype: `list[Dict[str,Any]]`
+    """
+    now = DateUtil.now().timestamp if now is None else now
+    old = {ev.url: ev for ev in previous}
+    changes = []
+    seen = set()
+    for ev in current:
+        seen.add(ev.url)
+        before = old.get(ev.url)
+        if before is None:
+            changes.append(_change(ChangeKind.ADDED,ev,now))
+            continue
+        if eventDigest(before) == eventDigest(ev):
+            continue
+        scheduleBefore = {k: getattr(before,k) for k in SCHEDULE_FIELDS if getattr(before,k) != getattr(ev,k)}
+        if scheduleBefore:
+            changes.append(_change(ChangeKind.RESCHEDULED,ev,now,scheduleBefore,{k: getattr(ev,k) for k in scheduleBefore}))
+        detailsBefore = {k: getattr(before,k) for k in DETAIL_FIELDS if getattr(before,k) != getattr(ev,k)}
+        detailsAfter = {k: getattr(ev,k) for k in detailsBefore}
+        contentKeys = [k for k in set(before.content) | set(ev.content) if before.content.get(k) != ev.content.get(k)]
+        if contentKeys:
+            detailsBefore['content'] = {k: before.content.get(k) for k in sorted(contentKeys)}
+            detailsAfter['content'] = {k: ev.content.get(k) for k in sorted(contentKeys)}
+        if detailsBefore:
+            changes.append(_change(ChangeKind.UPDATED,ev,now,detailsBefore,detailsAfter))
+    for url, ev in old.items():
+        if url not in seen:
+            changes.append(_change(ChangeKind.EXPIRED if ev.endDateTimestamp < now else ChangeKind.REMOVED,ev,now))
+    return changes
+
+class ChangeLog:
+    """
+    Append-only log of the changes between refreshes, stored as JSON lines.
+
+    :param path: The path of the log file.
+    :type path: `str`
+    """
+
+    def __init__(self,path:str=CHANGES_FILE) -> None:
+        self.__path = path
+
+    @property
+    def path(self):
+        return self.__path
+
+    def append(self,changes:List[Dict[str,Any]]):
+        """
+        Appends changes to the log.
+
+        :param changes: The changes, as returned by `diff`.
+        :type changes: `list[Dict[str,Any]]`
+        :return: The number of appended changes.
+        :rtype: `int`
+        """
+        if not changes:
+            return 0
+        with open(self.__path,'a',encoding='utf-8') as f:
+            f.write(''.join(json.dumps(change,ensure_ascii=False) + '\n' for change in changes))
+        LOGGER.info(f"Logged {len(changes)} changes in {self.__path}.")
+        return len(changes)
+
+    def read(self,since:Optional[float]=None,kinds:Optional[Iterable[str]]=None) -> Iterator[Dict[str,Any]]:
+        """
+        Iterates over the logged changes.
+
+        :param since: Only yield the changes logged at or after this timestamp.
+        :type since: `Optional[float]`
+        :param kinds: Only yield the changes of these kinds.
+        :type kinds: `Optional[Iterable[str]]`
+        :return: The changes, oldest first.
+        :rtype: `Iterator[Dict[str,Any]]`
+        """
+        if not os.path.exists(self.__path):
+            return
+        kinds = None if kinds is None else set(kinds)
+        with open(self.__path,'r',encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    change = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partially written last line
+                    LOGGER.warning(f"Skipping malformed line in {self.__path}.")
+                    continue
+                if since is not None and change['time'] < since:
+                    continue
+                if kinds is not None and change['kind'] not in kinds:
+                    continue
+                yield change
@@ -1,14 +1,28 @@
-import requests
+from ..net import CLIENT, Deadline
 from ..nebutil import Serializable
-from ..nebutil.time import DateUtil
+from ..nebutil.time import DateUtil, LOCAL_TZ, PARSE_CACHE_SIZE
+from functools import lru_cache
 from ..nebutil.log import LOGGER
 from ..nebutil.collections import Collec
 from typing import Callable, Dict,Any
 from bs4 import BeautifulSoup, Tag
-from typing import Any, Dict, Iterator, Sequence, Union, Optional, List
+from typing import Any, Dict, Iterable, Iterator, Sequence, Set, Union, Optional, List
 
 URL = "https://leekduck.com/events/"
 
+def fetchPage(url:str,deadline:Optional[float]=None) -> bytes:
+    """
+    Downloads the raw content of a page through the rate-limited, retrying client.
+    
+    :param url: The URL of the page.
+    :type url: `str`
+    :param deadline: The monotonic time by which the download must end, see `Deadline`.
+    :type deadline: `Optional[float]`
+    :return: The raw bytes of the page.
+    :rtype: `bytes`
+    """
+    return CLIENT.fetch(url,deadline=deadline)
+
 
 class EventType(Serializable):
     SPOTLIGHT_HOUR = 'SPOTLIGHT_HOUR'
@@ -57,20 +71,39 @@ class DataEvent(Serializable):
     
     def __init__(self,name:str,startDate:str,endDate:str,localtime:bool,eventType:str,content:Dict[str,Any],url:str,imgUrl:str):
         self.__name = name
-        try:
-            self.__startDate = DateUtil.fromStr(startDate).toStr
-        except ValueError:
-            self.__startDate = DateUtil.fromStr(startDate,DataEvent.ALTERNATE_DATE_FORMAT).toStr
-        try:
-            self.__endDate = DateUtil.fromStr(endDate).toStr
-        except ValueError:
-            self.__endDate = DateUtil.fromStr(endDate,DataEvent.ALTERNATE_DATE_FORMAT).toStr
+        self.__startDate = DataEvent.normalizeDate(startDate,localtime)
+        self.__endDate = DataEvent.normalizeDate(endDate,localtime)
         self.__localtime = localtime
         self.__eventType = eventType
         self.__content = content
         self.__url = url
         self.__imgUrl = imgUrl
     
+    @staticmethod
+    @lru_cache(maxsize=PARSE_CACHE_SIZE)
+    def normalizeDate(date:str,localtime:bool=True) -> str:
+        """
+        Converts a date from the website or from the data file to the format of the data file.
+        
+        Local time events keep the wall clock time of the website. Global events are moments in time: their dates are converted from the offset given by the website to the local timezone of the machine (`LOCAL_TZ`), in which the data file stores them.
+        
+        :param date: The date, in the `PROCESSING_DATE_FORMAT` or `ALTERNATE_DATE_FORMAT` format.
+        :type date: `str`
+        :param localtime: Whether the event happens at the same wall clock time in every timezone.
+        :type localtime: `bool`
+        :rtype: `str`
+        """
+        # Dates already in the alternate format cannot match the processing one, skip the failing parse
+        if date[10:11] == ' ':
+            return DateUtil.fromStr(date,DataEvent.ALTERNATE_DATE_FORMAT).toStr
+        try:
+            parsed = DateUtil.fromStr(date)
+            if not localtime and parsed.timezone is not None:
+                return DateUtil(parsed.date.astimezone(LOCAL_TZ)).toStr
+            return parsed.toStr
+        except ValueError:
+            return DateUtil.fromStr(date,DataEvent.ALTERNATE_DATE_FORMAT).toStr
+    
     @property
     def name(self):
         return self.__name
@@ -111,6 +144,23 @@ class DataEvent(Serializable):
     def imgUrl(self):
         return self.__imgUrl
     
+    @property
+    def header(self) -> Dict[str,Any]:
+        """
+        Returns the fields of the event available on the events listing, in the format of `DataEvent.headerFromSoup`.
+        
+        :rtype: `Dict[str,Any]`
+        """
+        return {
+            'name': self.name,
+            'startDate': self.startDate,
+            'endDate': self.endDate,
+            'localtime': self.localtime,
+            'eventType': self.eventType,
+            'url': self.url,
+            'imgUrl': self.imgUrl
+        }
+    
     def contentStr(self):
         s = ""
         for key,value in self.content.items():
@@ -131,8 +181,8 @@ class DataEvent(Serializable):
                 s += f"{value}\n"
         return s
     
-    def downloadImg(self,path:str):
-        response = requests.get(self.imgUrl)
+    def downloadImg(self,path:str,deadline:Optional[float]=None):
+        response = CLIENT.get(self.imgUrl,deadline=deadline)
         targetFile = f"{path}/{self.imgUrl.split('/')[-1]}"
         if response.status_code == 200:
             try:
@@ -142,8 +192,20 @@ class DataEvent(Serializable):
             except FileExistsError:
                 LOGGER.info(f"File {targetFile} already exists, skipping...")
     
-    @classmethod
-    def fromSoup(cls,timeDivKey,soup:Union[BeautifulSoup,Tag]):
+    @staticmethod
+    def headerFromSoup(timeDivKey,soup:Union[BeautifulSoup,Tag],now:Optional[float]=None) -> Optional[Dict[str,Any]]:
+        """
+        Parses the fields of an event available on the events listing, i.e. everything but its content.
+        
+        :param timeDivKey: The listing section of the event, `current` or `upcoming`.
+        :type timeDivKey: `str`
+        :param soup: The listing item of the event.
+        :type soup: `Union[BeautifulSoup,Tag]`
+        :param now: The timestamp before which ended events are skipped. Defaults to now.
+        :type now: `Optional[float]`
+        :return: The keyword arguments of `DataEvent` except `content`, or `None` if the item must be skipped.
+        :rtype: `Optional[Dict[str,Any]]`
+        """
         h5 = soup.select_one('h5') or Tag()
         a = soup.select_one('a')
         
@@ -154,7 +216,8 @@ class DataEvent(Serializable):
         if 'hide-event' not in a['class']:
             return None
         
-        localtime = bool(h5.attrs['data-event-local-time'])
+        # The attribute holds a string: only an explicit `true` marks a local time event
+        localtime = str(h5.attrs.get('data-event-local-time','')).strip().lower() == 'true'
         
         href = URL + a.attrs['href'][len('/events/'):]
         name = a.find("h2").text
@@ -172,17 +235,44 @@ class DataEvent(Serializable):
             endDateStr = h5.attrs['data-event-end-date']
             # If event has already ended, skip it
             endDateTest = DateUtil.fromStr(endDateStr)
-            if endDateTest.timestamp < DateUtil.now().timestamp:
+            if endDateTest.timestamp < (DateUtil.now().timestamp if now is None else now):
                 return None
         
-        contentResponse = requests.get(href).text
-        contentSoup = BeautifulSoup(contentResponse,'html5lib')
-        content = DataEvent.processContent(eventType,contentSoup)
+        return {
+            'name': name,
+            'startDate': startDateStr,
+            'endDate': endDateStr,
+            'localtime': localtime,
+            'eventType': eventType,
+            'url': href,
+            'imgUrl': img
+        }
+    
+    @classmethod
+    def fromSoup(cls,timeDivKey,soup:Union[BeautifulSoup,Tag],fetch:Callable[[str],bytes]=fetchPage):
+        header = DataEvent.headerFromSoup(timeDivKey,soup)
+        if header is None:
+            return None
+        return cls(content=DataEvent.contentFromPage(header['eventType'],fetch(header['url'])),**header)
+    
+    @staticmethod
+    def contentFromPage(eventType:str,page:bytes) -> Dict[str,Any]:
+        """
+        Parses the detail page of an event and extracts its content.
+        The parsed tree is freed before returning.
         
-        ev = cls(name,startDateStr,endDateStr,localtime,eventType,content,href,img)
-        with open('res.txt','a') as f:
-            f.write(str(ev) + '\n')
-        return ev
+        :param eventType: The type of the event.
+        :type eventType: `str`
+        :param page: The raw bytes of the detail page.
+        :type page: `bytes`
+        :return: The content of the event.
+        :rtype: `Dict[str,Any]`
+        """
+        contentSoup = BeautifulSoup(page,'html5lib')
+        try:
+            return DataEvent.processContent(eventType,contentSoup)
+        finally:
+            contentSoup.decompose()
     
     @staticmethod
     def processContent(eventType:str,soup:Union[BeautifulSoup,Tag]):
@@ -192,9 +282,14 @@ class DataEvent(Serializable):
             targetIds = [e.attrs['href'][1:] for e in features]
             html = soup.select_one("#raids + * + ul.pkmn-list-flex")
             anyEltCount = 2
-            while html is None:
+            raids = soup.select_one("#raids")
+            # The list cannot be further than the last sibling of the section title
+            siblings = len(raids.find_next_siblings()) if raids is not None else 0
+            while html is None and anyEltCount < siblings:
                 html = soup.select_one(f"#raids + {anyEltCount * '*+'} ul.pkmn-list-flex")
                 anyEltCount += 1
+            if html is None:
+                raise ValueError("No Pokémon list found after the #raids section.")
             pkmnNames = html.select(".pkmn-name")
             pkmnNames = [e.text.replace(" and ","").replace(",","") for e in pkmnNames]
             # Put alternate forms at the end of each name
@@ -291,8 +386,105 @@ class DataEvent(Serializable):
         return 8
     
 class DataEventCollection(Collec, Serializable):
+    SCHEMA = {'items': [DataEvent]}
+    
     def __init__(self, items: Iterator[DataEvent] | Sequence[DataEvent]) -> None:
         super().__init__(items)
+        self.__index = None
+        self.__names = None
+    
+    @property
+    def index(self):
+        """
+        Returns the lookup tables of the collection, built on first access.
+        
+        :return: The index of the collection.
+        :rtype: `EventIndex`
+        """
+        if self.__index is None:
+            from ..index import EventIndex
+            self.__index = EventIndex(self.items)
+        return self.__index
+    
+    @property
+    def names(self):
+        """
+        Returns the trigram index of the names and featured Pokémon of the collection, built on first access.
+        
+        :return: The name index of the collection.
+        :rtype: `NameIndex`
+        """
+        if self.__names is None:
+            from ..index import NameIndex
+            self.__names = NameIndex(self.items)
+        return self.__names
+    
+    def append(self,event:DataEvent):
+        super().append(event)
+        self.__index = None
+        if self.__names is not None:
+            self.__names.add(event)
+    
+    def extend(self,events:Iterable[DataEvent]):
+        events = list(events)
+        super().extend(events)
+        self.__index = None
+        if self.__names is not None:
+            for event in events:
+                self.__names.add(event)
+    
+    def remove(self,event:DataEvent):
+        super().remove(event)
+        # Positions after the removed event shift, both indexes are rebuilt on next access
+        self.__index = None
+        self.__names = None
+    
+    def query(self,types:Optional[Sequence[str]]=None,pokemons:Optional[Sequence[str]]=None,name:Optional[str]=None,after:Optional[float]=None,before:Optional[float]=None,strict=False):
+        """
+        Returns a filtered collection of the events matching every given criterion, using the index of the collection.
+        
+        :param types: The event types to keep.
+        :type types: `Optional[Sequence[str]]`
+        :param pokemons: The featured Pokémon to look for.
+        :type pokemons: `Optional[Sequence[str]]`
+        :param name: A string the event names must contain, ignoring case and accents.
+        :type name: `Optional[str]`
+        :param after: Keep the events still running at this timestamp.
+        :type after: `Optional[float]`
+        :param before: Keep the events starting before this timestamp.
+        :type before: `Optional[float]`
+        :param strict: If `True`, the events must feature every Pokémon of `pokemons` rather than at least one.
+        :type strict: `bool`
+        :return: A filtered collection, in the order of this collection.
+        :rtype: `DataEventCollection`
+        """
+        positions = self.index.query(types,pokemons,strict,after,before)
+        if name is not None:
+            matching = self.__nameMatches(name)
+            positions = [position for position in positions if position in matching]
+        return self.__class__([self.items[position] for position in positions])
+    
+    def __nameMatches(self,name:str) -> Set[int]:
+        from ..index import NAME, foldCase
+        # The trigram index ignores punctuation: its candidates are checked against the names with their punctuation
+        needle = foldCase(name)
+        return {position for position in self.names.containing(name,(NAME,)) if needle in foldCase(self.items[position].name)}
+    
+    def search(self,text:str,limit:Optional[int]=None,fuzzy=True):
+        """
+        Returns the events whose name or featured Pokémon match a text, best match first, ignoring case and accents.
+        Exact matches come first, then prefixes and substrings, then, if `fuzzy` is `True`, names close enough to tolerate typos.
+        
+        :param text: The text to look for.
+        :type text: `str`
+        :param limit: The maximum number of events. Unlimited if `None`.
+        :type limit: `Optional[int]`
+        :param fuzzy: Whether to include the fuzzy matches.
+        :type fuzzy: `bool`
+        :return: A ranked collection of the matching events.
+        :rtype: `DataEventCollection`
+        """
+        return self.__class__([self.items[position] for position,_ in self.names.search(text,limit,fuzzy)])
     
     def filter(self, func: Callable[[DataEvent], bool]):
         return self.__class__(filter(func,self.items))
@@ -386,13 +578,13 @@ class DataEventCollection(Collec, Serializable):
     
     def withNameLike(self,name:str):
         """
-        Returns a filtered collection containing only events whose name contains the specified string.
+        Returns a filtered collection containing only events whose name contains the specified string, ignoring case and accents. Punctuation and spaces must match.
         
         :param name: The string to search for in the event names.
         :type name: `str`
         :return: A filtered collection containing only events whose name contains the specified string.
         """
-        return self.filter(lambda ev: name.lower() in ev.name.lower())
+        return self.__class__([self.items[position] for position in sorted(self.__nameMatches(name))])
     
     def featuring(self,*pokemons:Union[str,List[str]],strict=False):
         """
@@ -414,16 +606,39 @@ class DataEventCollection(Collec, Serializable):
                 return self.filter(lambda ev: ev.eventType in EventType.all() and all(pokemon.upper() in ev.content['featuredPokemons'] for pokemon in pokemons[0]))
             return self.filter(lambda ev: ev.eventType in EventType.all() and any(pokemon.upper() in ev.content['featuredPokemons'] for pokemon in pokemons[0]))
     
-    def downloadImgs(self,path:str):
+    def timeline(self):
+        """
+        Returns vectorized timeline analytics (concurrency, gaps, densities, overlaps) over the events of the collection.
+        Requires NumPy.
+        
+        :return: The timeline of the collection.
+        :rtype: `Timeline`
+        """
+        from ..timeline import Timeline
+        return Timeline(self)
+    
+    def downloadImgs(self,path:str,deadline:Optional[Deadline]=None,requestTimeout:Optional[float]=None):
         """
         Downloads the images of each event in the collection to the specified path.
+        A failing image is skipped, and the remaining ones are once the deadline has passed.
         
         :param path: The path to download the images to.
         :type path: `str`
+        :param deadline: The deadline of the downloads. Never expires if `None`.
+        :type deadline: `Optional[Deadline]`
+        :param requestTimeout: The number of seconds allowed for each image.
+        :type requestTimeout: `Optional[float]`
         """
+        deadline = deadline or Deadline()
         LOGGER.info(f"Downloading {len(self)} images...")
-        for event in self:
-            event.downloadImg(path)
+        for index,event in enumerate(self):
+            if deadline.expired:
+                LOGGER.warning(f"Time budget exhausted, skipping {len(self) - index} images.")
+                break
+            try:
+                event.downloadImg(path,deadline.within(requestTimeout))
+            except Exception as e:
+                LOGGER.warning(f"Could not download {event.imgUrl}: {e}")
         LOGGER.info(f"Downloaded {len(self)} images.")
     
     def __add__(self, o: object):
@@ -0,0 +1,148 @@
+from typing import Any, Dict, Optional
+from ..changes import eventDigest
+from ..nebutil.time import DateUtil
+
+HOUR = 3600.
+DAY = 24 * HOUR
+
+class Tier:
+    ACTIVE = 'ACTIVE'
+    SOON = 'SOON'
+    NEAR = 'NEAR'
+    FAR = 'FAR'
+
+class RefreshPolicy:
+    """
+    Decides when the listing and each event must be fetched again.
+
+    Events are sorted in tiers by how close they are: currently active, starting soon, starting in the coming days, or further away.
+    Each tier has its own check interval. Outside of the soon tier, the interval doubles every time a check finds the event unchanged, up to `maxInterval`, or `activeMaxInterval` for active events.
+    The listing, which is the only way to discover new events, is checked on its own interval.
+
+    :param listingInterval: The number of seconds between two checks of the listing.
+    :type listingInterval: `float`
+    :param intervals: The number of seconds between two checks of an event, by tier.
+    :type intervals: `Optional[Dict[str,float]]`
+    :param soonWindow: Events starting within this number of seconds are in the `SOON` tier.
+    :type soonWindow: `float`
+    :param nearWindow: Events starting within this number of seconds are in the `NEAR` tier.
+    :type nearWindow: `float`
+    :param maxInterval: The longest interval between two checks of an event.
+    :type maxInterval: `float`
+    :param activeMaxInterval: The longest interval between two checks of an active event.
+    :type activeMaxInterval: `float`
+    """
+
+    DEFAULT_INTERVALS = {
+        Tier.ACTIVE: 2 * HOUR,
+        Tier.SOON: HOUR,
+        Tier.NEAR: 6 * HOUR,
+        Tier.FAR: DAY
+    }
+
+    def __init__(self,listingInterval:float=6 * HOUR,intervals:Optional[Dict[str,float]]=None,soonWindow:float=DAY,nearWindow:float=7 * DAY,maxInterval:float=7 * DAY,activeMaxInterval:float=8 * HOUR) -> None:
+        self.__listingInterval = listingInterval
+        self.__intervals = dict(RefreshPolicy.DEFAULT_INTERVALS,**(intervals or {}))
+        self.__soonWindow = soonWindow
+        self.__nearWindow = nearWindow
+        self.__maxInterval = maxInterval
+        self.__activeMaxInterval = activeMaxInterval
+
+    @property
+    def listingInterval(self):
+        return self.__listingInterval
+
+    def tier(self,event,now:float) -> str:
+        """
+        Returns the tier of an event.
+
+        :param event: The event.
+        :type event: `DataEvent`
+        :param now: The current timestamp.
+        :type now: `float`
+        :rtype: `str`
+        """
+        start = event.startDateTimestamp
+        if start <= now:
+            return Tier.ACTIVE
+        if start - now <= self.__soonWindow:
+            return Tier.SOON
+        if start - now <= self.__nearWindow:
+            return Tier.NEAR
+        return Tier.FAR
+
+    def interval(self,event,record:Dict[str,Any],now:float) -> float:
+        """
+        Returns the number of seconds between two checks of an event.
+
+        :param event: The event.
+        :type event: `DataEvent`
+        :param record: The freshness record of the event.
+        :type record: `Dict[str,Any]`
+        :param now: The current timestamp.
+        :type now: `float`
+        :rtype: `float`
+        """
+        tier = self.tier(event,now)
+        interval = self.__intervals[tier]
+        # Events about to start are not backed off, their last details often come in late
+        if tier != Tier.SOON:
+            interval *= 2 ** min(record.get('unchanged',0),16)
+        interval = min(interval,self.__activeMaxInterval if tier == Tier.ACTIVE else self.__maxInterval)
+        start = event.startDateTimestamp
+        # Check again as soon as the event enters a more frequently checked tier
+        for boundary in (start - self.__nearWindow,start - self.__soonWindow,start):
+            if now < boundary < now + interval:
+                return boundary - now
+        return interval
+
+    def nextCheck(self,event,record:Optional[Dict[str,Any]],now:Optional[float]=None) -> float:
+        """
+        Returns the timestamp at which an event must be checked again.
+
+        :param event: The event.
+        :type event: `DataEvent`
+        :param record: The freshness record of the event, `None` if it was never checked.
+        :type record: `Optional[Dict[str,Any]]`
+        :param now: The current timestamp. Defaults to now.
+        :type now: `Optional[float]`
+        :rtype: `float`
+        """
+        now = DateUtil.now().timestamp if now is None else now
+        if not record:
+            return now
+        return record['checked'] + self.interval(event,record,record['checked'])
+
+    def due(self,event,record:Optional[Dict[str,Any]],now:Optional[float]=None) -> bool:
+        """
+        Returns whether an event must be fetched again.
+
+        :rtype: `bool`
+        """
+        now = DateUtil.now().timestamp if now is None else now
+        return self.nextCheck(event,record,now) <= now
+
+    def listingDue(self,listingChecked:Optional[float],now:Optional[float]=None) -> bool:
+        """
+        Returns whether the listing must be fetched again.
+
+        :rtype: `bool`
+        """
+        now = DateUtil.now().timestamp if now is None else now
+        return listingChecked is None or listingChecked + self.__listingInterval <= now
+
+def checked(event,record:Optional[Dict[str,Any]],now:float) -> Dict[str,Any]:
+    """
+    Returns the freshness record of an event that has just been fetched.
+
+    :param event: The fetched event.
+    :type event: `DataEvent`
+    :param record: The previous freshness record of the event.
+    :type record: `Optional[Dict[str,Any]]`
+    :param now: The timestamp of the fetch.
+    :type now: `float`
+    :rtype: `Dict[str,Any]`
+    """
+    digest = eventDigest(event)
+    unchanged = record.get('unchanged',0) + 1 if record and record.get('hash') == digest else 0
+    return {'checked': now, 'hash': digest, 'unchanged': unchanged}
@@ -0,0 +1,260 @@
+import hashlib, os
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from icalendar import Calendar, Event, Alarm
+from ..events import DataEvent, EventType
+from ..nebutil.time import DateUtil
+
+UID_DOMAIN = 'leekduck.com'
+ALARM_TRIGGERS = (timedelta(minutes=-30),timedelta(hours=-1),timedelta(hours=-3))
+RECURRING_TYPES = (EventType.SPOTLIGHT_HOUR,EventType.RAID_HOUR)
+WEEK = timedelta(days=7)
+
+def eventUid(event:DataEvent) -> str:
+    """
+    Returns a stable UID for an event, derived from its URL.
+
+    :param event: The event.
+    :type event: `DataEvent`
+    :rtype: `str`
+    """
+    return f"{hashlib.sha1(event.url.encode('utf-8')).hexdigest()}@{UID_DOMAIN}"
+
+def eventStart(event:DataEvent):
+    return DateUtil.fromStr(event.startDate,DataEvent.ALTERNATE_DATE_FORMAT).date
+
+def eventEnd(event:DataEvent):
+    return DateUtil.fromStr(event.endDate,DataEvent.ALTERNATE_DATE_FORMAT).date
+
+def addAlarms(icsEvent:Event):
+    for trigger in ALARM_TRIGGERS:
+        alarm = Alarm()
+        alarm.add('trigger',trigger)
+        alarm.add('action','display')
+        icsEvent.add_component(alarm)
+
+def icsEvent(event:DataEvent,alarms=True) -> Event:
+    """
+    Converts an event to a VEVENT component.
+
+    :param event: The event to convert.
+    :type event: `DataEvent`
+    :param alarms: Whether to add the reminders.
+    :type alarms: `bool`
+    :rtype: `icalendar.Event`
+    """
+    component = Event()
+    component.add('uid',eventUid(event))
+    component.add('summary',event.name)
+    component.add('dtstart',eventStart(event))
+    component.add('dtend',eventEnd(event))
+    component.add('description',event.contentStr())
+    if alarms:
+        addAlarms(component)
+    return component
+
+def findSeries(events:Iterable[DataEvent],minLength=2) -> Tuple[Dict[str,List[DataEvent]],List[DataEvent]]:
+    """
+    Finds the weekly series among recurring event types (Spotlight Hours and Raid Hours).
+
+    Events of the same type starting on the same weekday at the same local time, with the same duration, and exactly one week apart form a series.
+
+    :param events: The events.
+    :type events: `Iterable[DataEvent]`
+    :param minLength: The minimum number of occurrences of a series.
+    :type minLength: `int`
+    :return: The series by UID, each sorted by start date, and the events that are not part of a series.
+    :rtype: `tuple[Dict[str,list[DataEvent]],list[DataEvent]]`
+    """
+    groups:Dict[tuple,List[DataEvent]] = {}
+    singles = []
+    for event in events:
+        if event.eventType not in RECURRING_TYPES:
+            singles.append(event)
+            continue
+        start = eventStart(event)
+        key = (event.eventType,start.weekday(),start.time(),eventEnd(event) - start)
+        groups.setdefault(key,[]).append(event)
+    series = {}
+    for (eventType,weekday,time,_),group in groups.items():
+        group.sort(key=eventStart)
+        runs = [[group[0]]]
+        for event in group[1:]:
+            if eventStart(event) - eventStart(runs[-1][-1]) == WEEK:
+                runs[-1].append(event)
+            else:
+                runs.append([event])
+        key = f"{eventType.lower()}-{weekday}-{time.strftime('%H%M')}"
+        for index,run in enumerate(runs):
+            if len(run) < minLength:
+                singles.extend(run)
+                continue
+            # Later runs of the same slot are told apart by their first date
+            uid = key if index == 0 else f"{key}-{eventStart(run[0]).strftime('%Y%m%d')}"
+            series[f"{uid}@{UID_DOMAIN}"] = run
+    return series, singles
+
+def seriesEvents(uid:str,occurrences:List[DataEvent]) -> List[Event]:
+    """
+    Converts a weekly series to a master VEVENT with an `RRULE`, followed by one `RECURRENCE-ID` override per occurrence whose summary or description differs from the first one.
+    Overrides only carry the dates of their occurrence, the summary or description that differ, and the reminders, which clients do not inherit from the master.
+
+    :param uid: The UID of the series.
+    :type uid: `str`
+    :param occurrences: The occurrences, sorted by start date.
+    :type occurrences: `list[DataEvent]`
+    :rtype: `list[icalendar.Event]`
+    """
+    first = occurrences[0]
+    firstDescription = first.contentStr()
+    master = icsEvent(first)
+    master['uid'] = uid
+    master.add('rrule',{'freq': 'weekly', 'count': len(occurrences)})
+    components = [master]
+    for occurrence in occurrences[1:]:
+        description = occurrence.contentStr()
+        if occurrence.name == first.name and description == firstDescription:
+            continue
+        override = Event()
+        override.add('uid',uid)
+        override.add('recurrence-id',eventStart(occurrence))
+        override.add('dtstart',eventStart(occurrence))
+        override.add('dtend',eventEnd(occurrence))
+        if occurrence.name != first.name:
+            override.add('summary',occurrence.name)
+        if description != firstDescription:
+            override.add('description',description)
+        addAlarms(override)
+        components.append(override)
+    return components
+
+def compressSeries(uid:str,occurrences:List[DataEvent]) -> List[Event]:
+    """
+    Returns the components of a weekly series: the recurring ones of `seriesEvents` if they are smaller once serialized, one VEVENT per occurrence otherwise.
+    Series whose occurrences mostly differ, e.g. Spotlight Hours featuring a new Pokémon every week, need an override for nearly every occurrence and are larger recurring than separate.
+
+    :param uid: The UID of the series.
+    :type uid: `str`
+    :param occurrences: The occurrences, sorted by start date.
+    :type occurrences: `list[DataEvent]`
+    :rtype: `list[icalendar.Event]`
+    """
+    recurring = seriesEvents(uid,occurrences)
+    separate = [icsEvent(occurrence) for occurrence in occurrences]
+    size = lambda components: sum(len(component.to_ical()) for component in components)
+    return recurring if size(recurring) < size(separate) else separate
+
+def buildCalendar(events:Iterable[DataEvent],compress=True) -> Calendar:
+    """
+    Builds the calendar of the events.
+
+    :param events: The events.
+    :type events: `Iterable[DataEvent]`
+    :param compress: Whether to write weekly Spotlight Hours and Raid Hours as recurring events, for the series where it makes the calendar smaller (see `compressSeries`).
+    :type compress: `bool`
+    :rtype: `icalendar.Calendar`
+    """
+    calendar = Calendar()
+    calendar.add('prodid','-//pokemongo-calendar//LeekDuck events//EN')
+    calendar.add('version','2.0')
+    if compress:
+        series, singles = findSeries(events)
+    else:
+        series, singles = {}, list(events)
+    for event in singles:
+        calendar.add_component(icsEvent(event))
+    for uid,occurrences in series.items():
+        for component in compressSeries(uid,occurrences):
+            calendar.add_component(component)
+    return calendar
+
+def eventBlocks(events:Iterable[DataEvent]) -> Dict[str,bytes]:
+    """
+    Serializes the VEVENT of each event by UID.
+    Events are never compressed into weekly series here: an event keeps the UID derived from its URL whichever series it would belong to, so merging again always updates the same entry.
+
+    :param events: The events.
+    :type events: `Iterable[DataEvent]`
+    :rtype: `Dict[str,bytes]`
+    """
+    return {eventUid(event): icsEvent(event).to_ical() for event in events}
+
+def _unfoldedUid(lines:List[bytes]) -> Optional[str]:
+    for index,line in enumerate(lines):
+        if line[:4].upper() == b'UID:' or line[:4].upper() == b'UID;':
+            value = line.rstrip(b'\r\n')
+            # Folded continuation lines start with a space or a tab
+            for continuation in lines[index + 1:]:
+                if continuation[:1] not in (b' ',b'\t'):
+                    break
+                value += continuation.rstrip(b'\r\n')[1:]
+            return value.split(b':',1)[1].decode('utf-8').strip()
+    return None
+
+def mergeCalendar(target:str,events:Iterable[DataEvent],output:Optional[str]=None) -> Tuple[int,int]:
+    """
+    Merges the events into an existing calendar file, streaming it line by line.
+
+    VEVENTs of the target whose UID matches one of the events are replaced (every component sharing the UID is replaced by the new VEVENT at the position of the first one).
+    Weekly series are not compressed, see `eventBlocks`.
+    The remaining events are inserted before the end of the first VCALENDAR. Everything else is copied byte for byte.
+    Only one VEVENT of the target is held in memory at a time. The result is written to a temporary file that replaces `output` once complete.
+
+    :param target: The path of the calendar file to merge into. It is created if it does not exist.
+    :type target: `str`
+    :param events: The events to merge.
+    :type events: `Iterable[DataEvent]`
+    :param output: The path of the merged file. Defaults to `target`.
+    :type output: `Optional[str]`
+    :return: The number of replaced and inserted UIDs.
+    :rtype: `tuple[int,int]`
+    """
+    output = output or target
+    blocks = eventBlocks(events)
+    if not os.path.exists(target):
+        with open(output,'wb') as f:
+            f.write(b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//pokemongo-calendar//LeekDuck events//EN\r\n' + b''.join(blocks.values()) + b'END:VCALENDAR\r\n')
+        return 0, len(blocks)
+    written = set()
+    replaced = 0
+    tmp = f'{output}.{os.getpid()}.tmp'
+    try:
+        with open(target,'rb') as source, open(tmp,'wb') as out:
+            component:Optional[List[bytes]] = None
+            inserted = False
+            for line in source:
+                keyword = line.rstrip(b'\r\n').upper()
+                if component is not None:
+                    component.append(line)
+                    if keyword == b'END:VEVENT':
+                        uid = _unfoldedUid(component)
+                        if uid in blocks:
+                            if uid not in written:
+                                out.write(blocks[uid])
+                                written.add(uid)
+                                replaced += 1
+                        else:
+                            out.writelines(component)
+                        component = None
+                    continue
+                if keyword == b'BEGIN:VEVENT':
+                    component = [line]
+                    continue
+                if keyword == b'END:VCALENDAR' and not inserted:
+                    # UIDs appearing only after this point are inserted here rather than replaced
+                    for uid,block in blocks.items():
+                        if uid not in written:
+                            out.write(block)
+                            written.add(uid)
+                    inserted = True
+                out.write(line)
+            if component is not None:
+                out.writelines(component)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp,output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return replaced, len(written) - replaced
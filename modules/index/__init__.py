@@ -0,0 +1,292 @@
+import re, unicodedata
+from bisect import bisect_left
+from collections import Counter
+from heapq import merge
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+class EventIndex:
+    """
+    Lookup tables over a sequence of events: positions by event type, by featured Pokémon, and by start and end time.
+    Queries intersect position sets instead of scanning every event.
+    Each table is built on the first query that needs it, so a query only pays for the criteria it uses.
+
+    :param events: The indexed events. The sequence must not change afterwards.
+    :type events: `Sequence[DataEvent]`
+    """
+
+    def __init__(self,events:Sequence) -> None:
+        self.__events = events
+        self.__size = len(events)
+        self.__byType:Optional[Dict[str,List[int]]] = None
+        self.__byPokemon:Optional[Dict[str,List[int]]] = None
+        self.__timeline:Optional[Tuple[List[float],List[int],List[float],List[int]]] = None
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def __types(self) -> Dict[str,List[int]]:
+        if self.__byType is None:
+            self.__byType = {}
+            for position,ev in enumerate(self.__events):
+                self.__byType.setdefault(ev.eventType,[]).append(position)
+        return self.__byType
+
+    def __pokemons(self) -> Dict[str,List[int]]:
+        if self.__byPokemon is None:
+            self.__byPokemon = {}
+            for position,ev in enumerate(self.__events):
+                for pokemon in ev.content.get('featuredPokemons',()):
+                    self.__byPokemon.setdefault(pokemon.upper(),[]).append(position)
+        return self.__byPokemon
+
+    def __times(self) -> Tuple[List[float],List[int],List[float],List[int]]:
+        if self.__timeline is None:
+            # Positions sorted by start and by end timestamp, for range queries
+            starts = sorted((ev.startDateTimestamp,position) for position,ev in enumerate(self.__events))
+            ends = sorted((ev.endDateTimestamp,position) for position,ev in enumerate(self.__events))
+            self.__timeline = ([start for start,_ in starts],[position for _,position in starts],[end for end,_ in ends],[position for _,position in ends])
+        return self.__timeline
+
+    @property
+    def types(self) -> List[str]:
+        return sorted(self.__types())
+
+    @property
+    def pokemons(self) -> List[str]:
+        return sorted(self.__pokemons())
+
+    def ofTypes(self,types:Iterable[str]) -> Set[int]:
+        """
+        Returns the positions of the events of the given types.
+
+        :rtype: `set[int]`
+        """
+        byType = self.__types()
+        return {position for eventType in types for position in byType.get(eventType,())}
+
+    def featuring(self,pokemons:Iterable[str],strict=False) -> Set[int]:
+        """
+        Returns the positions of the events featuring the given Pokémon.
+
+        :param pokemons: The Pokémon names, case insensitive.
+        :type pokemons: `Iterable[str]`
+        :param strict: Whether the events must feature every Pokémon rather than at least one.
+        :type strict: `bool`
+        :rtype: `set[int]`
+        """
+        byPokemon = self.__pokemons()
+        sets = [set(byPokemon.get(pokemon.upper(),())) for pokemon in pokemons]
+        if not sets:
+            return set()
+        return set.intersection(*sets) if strict else set.union(*sets)
+
+    def overlapping(self,after:Optional[float]=None,before:Optional[float]=None) -> Set[int]:
+        """
+        Returns the positions of the events running at some point between two timestamps.
+
+        :param after: The start of the window. Unbounded if `None`.
+        :type after: `Optional[float]`
+        :param before: The end of the window. Unbounded if `None`.
+        :type before: `Optional[float]`
+        :rtype: `set[int]`
+        """
+        starts, byStart, ends, byEnd = self.__times()
+        # Events starting before the end of the window, and events ending after its start
+        startedBefore = byStart[:len(starts) if before is None else bisect_left(starts,before)]
+        endedAfter = byEnd[0 if after is None else bisect_left(ends,after):]
+        if after is None or before is None:
+            return set(startedBefore if after is None else endedAfter)
+        # Only the smaller side is checked against the other bound
+        if len(startedBefore) <= len(endedAfter):
+            return {position for position in startedBefore if self.__events[position].endDateTimestamp >= after}
+        return {position for position in endedAfter if self.__events[position].startDateTimestamp < before}
+
+    def query(self,types:Optional[Iterable[str]]=None,pokemons:Optional[Iterable[str]]=None,strict=False,after:Optional[float]=None,before:Optional[float]=None) -> List[int]:
+        """
+        Returns the positions of the events matching every given criterion.
+
+        :return: The matching positions, in increasing order.
+        :rtype: `list[int]`
+        """
+        sets = []
+        if types is not None:
+            sets.append(self.ofTypes(types))
+        if pokemons is not None:
+            sets.append(self.featuring(pokemons,strict))
+        if after is not None or before is not None:
+            sets.append(self.overlapping(after,before))
+        if not sets:
+            return list(range(self.__size))
+        # Intersect from the smallest set
+        sets.sort(key=len)
+        return sorted(set.intersection(*sets))
+
+NAME = 'name'
+POKEMON = 'pokemon'
+
+def foldCase(text:str) -> str:
+    """
+    Normalizes a text for substring matching: accents removed (`é` becomes `e`) and case folded. Punctuation and spaces are kept.
+
+    :rtype: `str`
+    """
+    return ''.join(c for c in unicodedata.normalize('NFKD',text) if not unicodedata.combining(c)).casefold()
+
+def fold(text:str) -> str:
+    """
+    Normalizes a text for searching: `foldCase`, then every run of punctuation or spaces turned into a single space.
+
+    :rtype: `str`
+    """
+    return re.sub(r'[\W_]+',' ',foldCase(text)).strip()
+
+def trigrams(text:str) -> Set[str]:
+    """
+    Returns the trigrams of a folded text.
+
+    :rtype: `set[str]`
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class NameIndex:
+    """
+    Trigram index over the folded names and featured Pokémon of a sequence of events.
+
+    Identical terms are indexed once, with the positions of the events they belong to, so the index grows with the number of distinct names rather than with the number of events.
+    Terms are padded with two leading spaces and a trailing one, so that prefixes and whole words have trigrams of their own.
+
+    :param events: The indexed events.
+    :type events: `Iterable[DataEvent]`
+    """
+
+    EXACT = 4
+    PREFIX = 3
+    WORD_PREFIX = 2
+    SUBSTRING = 1
+    FUZZY = 0
+
+    def __init__(self,events:Iterable=()) -> None:
+        self.__terms:List[str] = []
+        self.__termIds:Dict[str,int] = {}
+        # Positions and fields of the events of each term
+        self.__owners:List[List[Tuple[int,str]]] = []
+        self.__gramCounts:List[int] = []
+        self.__postings:Dict[str,Set[int]] = {}
+        self.__size = 0
+        for event in events:
+            self.add(event)
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def add(self,event):
+        """
+        Indexes an event at the next position.
+
+        :param event: The event.
+        :type event: `DataEvent`
+        """
+        position = self.__size
+        self.__size += 1
+        self.__addTerm(event.name,position,NAME)
+        for pokemon in event.content.get('featuredPokemons',()):
+            self.__addTerm(pokemon,position,POKEMON)
+
+    def __addTerm(self,text:str,position:int,field:str):
+        term = fold(text)
+        if not term:
+            return
+        termId = self.__termIds.get(term)
+        if termId is None:
+            termId = self.__termIds[term] = len(self.__terms)
+            self.__terms.append(term)
+            self.__owners.append([])
+            grams = trigrams(f'  {term} ')
+            self.__gramCounts.append(len(grams))
+            for gram in grams:
+                self.__postings.setdefault(gram,set()).add(termId)
+        self.__owners[termId].append((position,field))
+
+    def __containing(self,query:str) -> Iterable[int]:
+        if len(query) < 3:
+            # Too short for a trigram, the distinct terms are scanned
+            return (termId for termId,term in enumerate(self.__terms) if query in term)
+        # Intersect the postings from the rarest trigram
+        postings = sorted((self.__postings.get(gram,set()) for gram in trigrams(query)),key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return (termId for termId in candidates if query in self.__terms[termId])
+
+    def __rank(self,query:str,termId:int,similarity:float=1.) -> float:
+        term = self.__terms[termId]
+        if term == query:
+            return NameIndex.EXACT
+        if term.startswith(query):
+            return NameIndex.PREFIX + len(query) / len(term)
+        if f' {query}' in f' {term}':
+            return NameIndex.WORD_PREFIX + len(query) / len(term)
+        if query in term:
+            return NameIndex.SUBSTRING + len(query) / len(term)
+        return NameIndex.FUZZY + similarity
+
+    def containing(self,text:str,fields:Sequence[str]=(NAME,POKEMON)) -> Set[int]:
+        """
+        Returns the positions of the events with a term containing a text, after folding.
+
+        :param text: The text to look for.
+        :type text: `str`
+        :param fields: The terms to look in, among `NAME` and `POKEMON`.
+        :type fields: `Sequence[str]`
+        :rtype: `set[int]`
+        """
+        query = fold(text)
+        return {position for termId in self.__containing(query) for position,field in self.__owners[termId] if field in fields}
+
+    def search(self,text:str,limit:Optional[int]=None,fuzzy=True,threshold:float=.5,fields:Sequence[str]=(NAME,POKEMON)) -> List[Tuple[int,float]]:
+        """
+        Returns the positions of the events matching a text, best first.
+
+        Exact matches rank first, then prefixes of a whole term, prefixes of a word and other substrings, each ranked by the share of the term they cover.
+        When there are fewer than `limit` of those, terms sharing at least `threshold` of the trigrams of the text are added, ranked by trigram similarity, which tolerates typos.
+
+        :param text: The text to look for.
+        :type text: `str`
+        :param limit: The maximum number of results. Unlimited if `None`.
+        :type limit: `Optional[int]`
+        :param fuzzy: Whether to add the fuzzy matches.
+        :type fuzzy: `bool`
+        :param threshold: The share of the trigrams of the text that a fuzzy match must contain.
+        :type threshold: `float`
+        :param fields: The terms to look in, among `NAME` and `POKEMON`.
+        :type fields: `Sequence[str]`
+        :return: The positions and scores of the matching events. Ties keep the order of the positions.
+        :rtype: `list[tuple[int,float]]`
+        """
+        query = fold(text)
+        if not query:
+            return []
+        # Terms are ranked first, their events are only listed until the limit is reached
+        scores:Dict[int,float] = {termId: self.__rank(query,termId) for termId in self.__containing(query)}
+        if fuzzy and (limit is None or sum(len(self.__owners[termId]) for termId in scores) < limit):
+            grams = trigrams(f'  {query} ')
+            shared = Counter(termId for gram in grams for termId in self.__postings.get(gram,()))
+            for termId,count in shared.items():
+                if termId not in scores and count >= threshold * len(grams):
+                    # Jaccard similarity of the trigram sets
+                    scores[termId] = self.__rank(query,termId,count / (len(grams) + self.__gramCounts[termId] - count))
+        ranked:List[Tuple[int,float]] = []
+        seen = set()
+        terms = sorted(scores,key=lambda termId: -scores[termId])
+        for score,group in groupby(terms,key=lambda termId: scores[termId]):
+            # Owners are sorted by position, merging them keeps ties in position order
+            for position,field in merge(*(self.__owners[termId] for termId in group)):
+                if field in fields and position not in seen:
+                    seen.add(position)
+                    ranked.append((position,score))
+                    if limit is not None and len(ranked) >= limit:
+                        return ranked
+        return ranked
@@ -1,5 +1,25 @@
-from typing import Any, Dict
+import inspect, json
+from operator import attrgetter
+from typing import Any, Dict, List, Optional, Tuple, Type
+
 class Serializable:
+    """
+    Base class of the objects that can be converted to JSON.
+    
+    The serialized fields of a class are the parameters of its constructor, read through the properties of the same names.
+    Fields holding other `Serializable` objects are declared in the `SCHEMA` class attribute, mapping a field name to a class, or to a one-element list `[cls]` for a list of objects.
+    """
+    SCHEMA:Dict[str,Any] = {}
+    
+    @classmethod
+    def codec(cls) -> 'Codec':
+        """
+        Returns the codec of the class, compiled on first use.
+        :returns: the codec of the class.
+        :rtype: `Codec`
+        """
+        return codecOf(cls)
+    
     @staticmethod
     def serialize(o:Any):
         """
@@ -10,9 +30,118 @@ class Serializable:
         :rtype: Any
         """
         if isinstance(o, Serializable):
-            # Remove the class name from each key
-            return {k.strip(f'_{o.__class__.__name__}__'): v for k, v in o.__dict__.items()}
+            return codecOf(type(o)).encode(o)
         raise TypeError("Object of type %s is not JSON serializable" % type(o))
+
+class Codec:
+    """
+    Encoder and decoder of a `Serializable` class, compiled once from its constructor signature and its `SCHEMA`.
+    :param cls: the class.
+    :type cls: `Type[Serializable]`
+    """
+    def __init__(self,cls:Type[Serializable]) -> None:
+        self.__cls = cls
+        parameters = list(inspect.signature(cls.__init__).parameters.values())[1:]
+        self.__fields:Tuple[str,...] = tuple(p.name for p in parameters if p.kind in (p.POSITIONAL_OR_KEYWORD,p.KEYWORD_ONLY))
+        getter = attrgetter(*self.__fields) if self.__fields else (lambda o: ())
+        self.__getter = getter if len(self.__fields) != 1 else (lambda o: (getter(o),))
+        # Nested codecs are resolved on first use, the classes may reference each other
+        self.__nested:Optional[List[Tuple[int,'Codec',bool]]] = None
+    
+    @property
+    def fields(self) -> Tuple[str,...]:
+        """
+        Returns the names of the serialized fields, in constructor order.
+        :rtype: `tuple[str]`
+        """
+        return self.__fields
+    
+    def __nestedFields(self):
+        if self.__nested is None:
+            nested = []
+            for field,kind in self.__cls.SCHEMA.items():
+                isList = isinstance(kind,list)
+                nested.append((self.__fields.index(field),codecOf(kind[0] if isList else kind),isList))
+            self.__nested = nested
+        return self.__nested
+    
+    def encode(self,o:Any) -> Dict[str,Any]:
+        """
+        Encodes an object to a dictionary of JSON values.
+        :param o: the object.
+        :returns: the field values by field name.
+        :rtype: `Dict[str,Any]`
+        """
+        values = self.__getter(o)
+        nested = self.__nestedFields()
+        if nested:
+            values = list(values)
+            for index,codec,isList in nested:
+                values[index] = [codec.encode(v) for v in values[index]] if isList else codec.encode(values[index])
+        return dict(zip(self.__fields,values))
+    
+    def decode(self,data:Dict[str,Any]) -> Any:
+        """
+        Decodes an object from a dictionary returned by `encode`.
+        :param data: the field values by field name.
+        :type data: `Dict[str,Any]`
+        :returns: the object.
+        """
+        values = [data[field] for field in self.__fields]
+        for index,codec,isList in self.__nestedFields():
+            values[index] = [codec.decode(v) for v in values[index]] if isList else codec.decode(values[index])
+        return self.__cls(*values)
+    
+    def pack(self,o:Any) -> List[Any]:
+        """
+        Encodes an object to a compact list of JSON values, in field order.
+        :param o: the object.
+        :returns: the field values.
+        :rtype: `list`
+        """
+        values = list(self.__getter(o))
+        for index,codec,isList in self.__nestedFields():
+            values[index] = [codec.pack(v) for v in values[index]] if isList else codec.pack(values[index])
+        return values
+    
+    def unpack(self,values:List[Any]) -> Any:
+        """
+        Decodes an object from a list returned by `pack`.
+        :param values: the field values.
+        :type values: `list`
+        :returns: the object.
+        """
+        values = list(values)
+        for index,codec,isList in self.__nestedFields():
+            values[index] = [codec.unpack(v) for v in values[index]] if isList else codec.unpack(values[index])
+        return self.__cls(*values)
+    
+    def dumps(self,o:Any) -> bytes:
+        """
+        Encodes an object to compact UTF-8 JSON bytes.
+        :rtype: `bytes`
+        """
+        return json.dumps(self.pack(o),ensure_ascii=False,separators=(',',':')).encode('utf-8')
+    
+    def loads(self,data:bytes) -> Any:
+        """
+        Decodes an object from bytes returned by `dumps`.
+        """
+        return self.unpack(json.loads(data))
+
+_CODECS:Dict[type,Codec] = {}
+
+def codecOf(cls:Type[Serializable]) -> Codec:
+    """
+    Returns the codec of a class, compiling it on first use.
+    :param cls: the class.
+    :type cls: `Type[Serializable]`
+    :rtype: `Codec`
+    """
+    codec = _CODECS.get(cls)
+    if codec is None:
+        codec = _CODECS[cls] = Codec(cls)
+    return codec
     
 def serializer(o:Any) -> Dict[str,Any]:
     if isinstance(o,Serializable):
@@ -1,5 +1,5 @@
 import copy
-from typing import Any, Callable, Iterator, Optional, Sequence, Union, List
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, Union, List
 from .. import Serializable
 class Collec(Serializable):
     def __init__(self,items:Union[Iterator[Any],Sequence[Any]]) -> None:
@@ -79,6 +79,31 @@ class Collec(Serializable):
                 return self.__class__(sorted(self.__items,key=key))
             return self.__class__(sorted(self.__items,key=key,reverse=reverse))
         
+    def append(self,item:Any):
+        """
+        Adds an item at the end of the collection.
+        :param item: the item to add.
+        :type item: `Any`
+        """
+        self.__items.append(item)
+    
+    def extend(self,items:Iterable[Any]):
+        """
+        Adds items at the end of the collection.
+        :param items: the items to add.
+        :type items: `Iterable[Any]`
+        """
+        self.__items.extend(items)
+    
+    def remove(self,item:Any):
+        """
+        Removes the first occurrence of an item from the collection.
+        :param item: the item to remove.
+        :type item: `Any`
+        :raises ValueError: if the item is not in the collection.
+        """
+        self.__items.remove(item)
+    
     def forEach(self,func:Callable[[Any],Any]):
         """
         Applies a function to each item of the collection.
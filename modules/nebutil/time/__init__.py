@@ -1,17 +1,65 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Optional
 
 PROCESSING_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
 OUTPUT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+PARSE_CACHE_SIZE = 4096
 
 TZ = None
 LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+def _fastParse(s:str,format:str) -> Optional[datetime]:
+    """
+    Parses the fixed formats used throughout the project by slicing the string.
+    Returns `None` when the string does not strictly match, so that the caller can fall back on `datetime.strptime`.
+    """
+    if format == OUTPUT_DATE_FORMAT:
+        if len(s) != 19 or s[10] != ' ':
+            return None
+        tz = None
+    elif format == PROCESSING_DATE_FORMAT:
+        if len(s) < 20 or s[10] != 'T':
+            return None
+        suffix = s[19:]
+        if suffix == 'Z':
+            tz = timezone.utc
+        elif len(suffix) in (5,6) and suffix[0] in '+-' and (len(suffix) == 5 or suffix[3] == ':'):
+            hours, minutes = suffix[1:3], suffix[-2:]
+            if not (hours.isdigit() and minutes.isdigit()):
+                return None
+            offset = timedelta(hours=int(hours),minutes=int(minutes))
+            tz = timezone(-offset if suffix[0] == '-' else offset)
+        else:
+            return None
+    else:
+        return None
+    if s[4] != '-' or s[7] != '-' or s[13] != ':' or s[16] != ':':
+        return None
+    fields = (s[0:4],s[5:7],s[8:10],s[11:13],s[14:16],s[17:19])
+    if not all(f.isdigit() and f.isascii() for f in fields):
+        return None
+    try:
+        return datetime(*map(int,fields),tzinfo=tz)
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(s:str,format:str):
+    date = _fastParse(s,format) or datetime.strptime(s,format)
+    return date, date.timestamp()
+
 class DateUtil:
     """
     Provides utility methods for working with dates and timestamps in Python.
+    
+    A `DateUtil` is backed either by a `datetime` or by an epoch timestamp; the missing one is computed on first access.
     """
     
-    def __init__(self,date:datetime) -> None:
+    def __init__(self,date:Optional[datetime],epoch:Optional[float]=None,tz:Optional[tzinfo]=None) -> None:
         self.__date = date
+        self.__epoch = epoch
+        self.__tz = date.tzinfo if date is not None else tz
         
     @classmethod
     def fromStr(cls,s:str,format=PROCESSING_DATE_FORMAT):
@@ -24,7 +72,7 @@ class DateUtil:
         :return: a DateUtil object.
         :rtype: `DateUtil`
         """
-        return cls(datetime.strptime(s,format))
+        return cls(*_parse(s,format))
     
     @classmethod
     def fromTimestamp(cls,timestamp,tz=None):
@@ -37,7 +85,7 @@ class DateUtil:
         :return: a DateUtil object.
         :rtype: `DateUtil`
         """
-        return cls(datetime.fromtimestamp(timestamp,tz))
+        return cls(None,timestamp,tz)
     
     @classmethod
     def now(cls):
@@ -49,7 +97,7 @@ class DateUtil:
         return cls(datetime.now())
     
     def __str__(self):
-        return self.__date.strftime(OUTPUT_DATE_FORMAT)
+        return self.date.strftime(OUTPUT_DATE_FORMAT)
     
     @property
     def date(self):
@@ -58,6 +106,8 @@ class DateUtil:
         :return: the datetime object.
         :rtype: `datetime`
         """
+        if self.__date is None:
+            self.__date = datetime.fromtimestamp(self.__epoch,self.__tz)
         return self.__date
     
     @property
@@ -67,7 +117,9 @@ class DateUtil:
         :return: the timestamp.
         :rtype: `float`
         """
-        return self.__date.timestamp()
+        if self.__epoch is None:
+            self.__epoch = self.__date.timestamp()
+        return self.__epoch
     
     @property
     def timezone(self):
@@ -76,7 +128,7 @@ class DateUtil:
         :return: the timezone.
         :rtype: `datetime.tzinfo`
         """
-        return self.__date.tzinfo
+        return self.__tz
     
     @property
     def toStr(self):
@@ -104,21 +156,25 @@ class DateUtil:
             return DateUtil.fromTimestamp(self.timestamp - other,self.timezone)
     
     def __iadd__(self,other):
+        date = self.date
         if isinstance(other,timedelta):
-            self.__date += other
+            date += other
         elif isinstance(other,DateUtil):
-            self.__date += timedelta(seconds=other.timestamp)
+            date += timedelta(seconds=other.timestamp)
         elif isinstance(other,float) or isinstance(other,int):
-            self.__date += timedelta(seconds=other)
+            date += timedelta(seconds=other)
+        self.__date, self.__epoch = date, None
         return self
     
     def __isub__(self,other):
+        date = self.date
         if isinstance(other,timedelta):
-            self.__date -= other
+            date -= other
         elif isinstance(other,DateUtil):
-            self.__date -= timedelta(seconds=other.timestamp)
+            date -= timedelta(seconds=other.timestamp)
         elif isinstance(other,float) or isinstance(other,int):
-            self.__date -= timedelta(seconds=other)
+            date -= timedelta(seconds=other)
+        self.__date, self.__epoch = date, None
         return self
     
     def __lt__(self,other):
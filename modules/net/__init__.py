@@ -0,0 +1,324 @@
+import random, threading, time
+import requests
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from ..nebutil.log import LOGGER
+
+# 503 only counts as throttling when it comes with a Retry-After header, otherwise it is retried as a server error
+THROTTLE_STATUSES = (429,503)
+RETRY_STATUSES = (429,500,502,503,504)
+DEFAULT_TIMEOUT = (5.,30.)
+
+def parseRetryAfter(value:Optional[str],now:Optional[float]=None) -> Optional[float]:
+    """
+    Parses a `Retry-After` header, given either in seconds or as an HTTP date.
+
+    :param value: The header value.
+    :type value: `Optional[str]`
+    :return: The number of seconds to wait, or `None` if the header is missing or invalid.
+    :rtype: `Optional[float]`
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError,ValueError):
+        return None
+    return max(date.timestamp() - (time.time() if now is None else now),0.)
+
+class DeadlineExceeded(requests.Timeout):
+    """
+    Raised when a request cannot complete before its deadline.
+    """
+
+class Deadline:
+    """
+    A point in time after which work must stop, on the monotonic clock.
+
+    :param seconds: The number of seconds from now. `None` never expires.
+    :type seconds: `Optional[float]`
+    """
+
+    def __init__(self,seconds:Optional[float]=None) -> None:
+        self.__at = None if seconds is None else time.monotonic() + seconds
+
+    @property
+    def at(self) -> Optional[float]:
+        return self.__at
+
+    @property
+    def remaining(self) -> Optional[float]:
+        """
+        Returns the number of seconds left, `None` if the deadline never expires.
+
+        :rtype: `Optional[float]`
+        """
+        return None if self.__at is None else max(self.__at - time.monotonic(),0.)
+
+    @property
+    def expired(self) -> bool:
+        return self.__at is not None and time.monotonic() >= self.__at
+
+    def within(self,seconds:Optional[float]) -> Optional[float]:
+        """
+        Returns the deadline of a step that must end within a number of seconds from now, and before this deadline.
+
+        :param seconds: The number of seconds allowed for the step. `None` only bounds it by this deadline.
+        :type seconds: `Optional[float]`
+        :return: The monotonic time of the deadline of the step, `None` if it never expires.
+        :rtype: `Optional[float]`
+        """
+        step = None if seconds is None else time.monotonic() + seconds
+        if step is None or self.__at is None:
+            return self.__at if step is None else step
+        return min(step,self.__at)
+
+def capTimeout(timeout:Union[float,Tuple[float,float]],remaining:float) -> Union[float,Tuple[float,float]]:
+    if isinstance(timeout,tuple):
+        return tuple(min(t,remaining) for t in timeout)
+    return min(timeout,remaining)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, implemented as a virtual scheduling clock: each call to `acquire` reserves the next free slot and sleeps until it.
+
+    :param rate: The number of tokens refilled per second.
+    :type rate: `float`
+    :param capacity: The maximum number of tokens, i.e. the allowed burst.
+    :type capacity: `float`
+    """
+
+    def __init__(self,rate:float,capacity:float=1.) -> None:
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._capacity = max(capacity,1.)
+        # Theoretical arrival time: when the bucket will be full again once every reserved token is used
+        self._tat = time.monotonic()
+        self._pausedUntil = 0.
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def reserve(self,maxWait:Optional[float]=None) -> Optional[float]:
+        """
+        Takes a token, possibly from the future.
+
+        :param maxWait: The longest acceptable wait in seconds. No token is taken if the next one comes later. `None` accepts any wait.
+        :type maxWait: `Optional[float]`
+        :return: The number of seconds to wait before using the token, or `None` if none was taken.
+        :rtype: `Optional[float]`
+        """
+        with self._lock:
+            now = time.monotonic()
+            interval = 1. / self._rate
+            tat = max(self._tat,now)
+            start = max(now,tat - (self._capacity - 1) * interval,self._pausedUntil)
+            if maxWait is not None and start - now > maxWait:
+                return None
+            self._tat = max(tat,start) + interval
+            return start - now
+
+    def tryAcquire(self) -> bool:
+        """
+        Takes a token only if one is available right now.
+
+        :return: Whether a token was taken.
+        :rtype: `bool`
+        """
+        with self._lock:
+            now = time.monotonic()
+            interval = 1. / self._rate
+            tat = max(self._tat,now)
+            if now < max(tat - (self._capacity - 1) * interval,self._pausedUntil):
+                return False
+            self._tat = tat + interval
+            return True
+
+    def acquire(self,maxWait:Optional[float]=None) -> Optional[float]:
+        """
+        Blocks until a token is available.
+
+        :param maxWait: The longest acceptable wait in seconds, see `reserve`.
+        :type maxWait: `Optional[float]`
+        :return: The number of seconds waited, or `None` without waiting if the token would come later than `maxWait`.
+        :rtype: `Optional[float]`
+        """
+        wait = self.reserve(maxWait)
+        if wait is not None and wait > 0:
+            time.sleep(wait)
+        return wait
+
+class AdaptiveLimiter(TokenBucket):
+    """
+    Token bucket whose rate follows an additive-increase/multiplicative-decrease policy: it slowly speeds up on every success and halves when the server throttles, pausing for the `Retry-After` delay if there is one.
+    The rate thus settles right under the throttling threshold of the server.
+
+    :param rate: The initial number of requests per second.
+    :type rate: `float`
+    :param minRate: The lowest rate.
+    :type minRate: `float`
+    :param maxRate: The highest rate.
+    :type maxRate: `float`
+    :param increase: The rate added on each success.
+    :type increase: `float`
+    :param decrease: The factor applied to the rate on each throttled response.
+    :type decrease: `float`
+    :param capacity: The allowed burst.
+    :type capacity: `float`
+    :param maxPause: The longest pause in seconds, whatever the `Retry-After` delay.
+    :type maxPause: `float`
+    """
+
+    def __init__(self,rate:float=5.,minRate:float=.2,maxRate:float=50.,increase:float=.5,decrease:float=.5,capacity:float=2.,maxPause:float=60.) -> None:
+        super().__init__(rate,capacity)
+        self.__maxPause = maxPause
+        self.__minRate = minRate
+        self.__maxRate = maxRate
+        self.__increase = increase
+        self.__decrease = decrease
+        self.__decreasedAt = 0.
+
+    def success(self):
+        with self._lock:
+            self._rate = min(self._rate + self.__increase,self.__maxRate)
+
+    def throttled(self,retryAfter:Optional[float]=None):
+        if retryAfter:
+            retryAfter = min(retryAfter,self.__maxPause)
+        with self._lock:
+            now = time.monotonic()
+            if retryAfter:
+                self._pausedUntil = max(self._pausedUntil,now + retryAfter)
+            # Concurrent requests throttled by the same overload only slow down once
+            if now - self.__decreasedAt < 1. / self._rate + (retryAfter or 0.):
+                return
+            self.__decreasedAt = now
+            self._rate = max(self._rate * self.__decrease,self.__minRate)
+            rate = self._rate
+        LOGGER.info(f"Throttled, slowing down to {rate:.2f} requests/s" + (f" after a {retryAfter:.1f}s pause." if retryAfter else "."))
+
+class HttpClient:
+    """
+    HTTP client with one adaptive rate limiter per host, timeouts and jittered exponential retries.
+
+    Responses with a retryable status (429, 5xx) and connection errors are retried up to `retries` times, waiting a random delay up to `backoff * 2 ** attempt` seconds (capped at `maxBackoff`), or longer if the server sent a `Retry-After` header.
+
+    :param retries: The number of retries after the first attempt.
+    :type retries: `int`
+    :param backoff: The base retry delay in seconds.
+    :type backoff: `float`
+    :param maxBackoff: The maximum retry delay in seconds.
+    :type maxBackoff: `float`
+    :param timeout: The connect and read timeouts of a request in seconds.
+    :type timeout: `Union[float,Tuple[float,float]]`
+    :param limiterOptions: The options of each host's `AdaptiveLimiter`.
+    """
+
+    def __init__(self,retries:int=4,backoff:float=.5,maxBackoff:float=30.,timeout:Union[float,Tuple[float,float]]=DEFAULT_TIMEOUT,poolSize:int=16,**limiterOptions) -> None:
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__maxBackoff = maxBackoff
+        self.__timeout = timeout
+        self.__limiterOptions = limiterOptions
+        self.__limiters:Dict[str,AdaptiveLimiter] = {}
+        self.__lock = threading.Lock()
+        self.__session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=poolSize,pool_maxsize=poolSize)
+        self.__session.mount('http://',adapter)
+        self.__session.mount('https://',adapter)
+
+    def limiter(self,url:str) -> AdaptiveLimiter:
+        """
+        Returns the rate limiter of the host of a URL.
+
+        :param url: The URL.
+        :type url: `str`
+        :rtype: `AdaptiveLimiter`
+        """
+        host = urlsplit(url).netloc
+        with self.__lock:
+            if host not in self.__limiters:
+                self.__limiters[host] = AdaptiveLimiter(**self.__limiterOptions)
+            return self.__limiters[host]
+
+    def retryDelay(self,attempt:int,retryAfter:Optional[float]=None) -> float:
+        delay = random.uniform(0,min(self.__maxBackoff,self.__backoff * 2 ** attempt))
+        if retryAfter is not None:
+            delay = max(delay,min(retryAfter,self.__maxBackoff))
+        return delay
+
+    def get(self,url:str,timeout:Optional[Union[float,Tuple[float,float]]]=None,deadline:Optional[float]=None,**kwargs) -> requests.Response:
+        """
+        Sends a rate-limited GET request, retrying on throttling, server errors and connection errors.
+
+        :param url: The URL.
+        :type url: `str`
+        :param timeout: The timeouts of each attempt. Defaults to the client's timeouts.
+        :type timeout: `Optional[Union[float,Tuple[float,float]]]`
+        :param deadline: The monotonic time after which no attempt is started, see `Deadline`. The timeouts of each attempt are shortened to end by then, and retries that would wait past it are given up.
+        :type deadline: `Optional[float]`
+        :return: The last response. Its status may still be a retryable one if every attempt failed.
+        :rtype: `requests.Response`
+        :raises requests.RequestException: if the last attempt could not get a response.
+        :raises DeadlineExceeded: if the deadline passed before an attempt could start.
+        """
+        limiter = self.limiter(url)
+        timeout = self.__timeout if timeout is None else timeout
+        for attempt in range(self.__retries + 1):
+            # The token is only taken if it comes before the deadline, so a slow or paused host does not hold the caller past it
+            if limiter.acquire(None if deadline is None else deadline - time.monotonic()) is None:
+                raise DeadlineExceeded(f"Deadline exceeded before requesting {url}")
+            attemptTimeout = timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"Deadline exceeded before requesting {url}")
+                attemptTimeout = capTimeout(timeout,remaining)
+            last = attempt == self.__retries
+            try:
+                response = self.__session.get(url,timeout=attemptTimeout,**kwargs)
+            except (requests.ConnectionError,requests.Timeout) as e:
+                delay = self.retryDelay(attempt)
+                if last or (deadline is not None and time.monotonic() + delay >= deadline):
+                    raise
+                LOGGER.info(f"{e.__class__.__name__} on {url}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                limiter.success()
+                return response
+            retryAfter = parseRetryAfter(response.headers.get('Retry-After'))
+            if response.status_code in THROTTLE_STATUSES and (response.status_code == 429 or retryAfter is not None):
+                limiter.throttled(retryAfter)
+            delay = self.retryDelay(attempt,retryAfter)
+            if last or (deadline is not None and time.monotonic() + delay >= deadline):
+                return response
+            LOGGER.info(f"HTTP {response.status_code} on {url}, retrying in {delay:.1f}s...")
+            response.close()
+            time.sleep(delay)
+        raise AssertionError('unreachable')
+
+    def fetch(self,url:str,timeout:Optional[Union[float,Tuple[float,float]]]=None,deadline:Optional[float]=None) -> bytes:
+        """
+        Downloads the raw content of a URL.
+
+        :param url: The URL.
+        :type url: `str`
+        :param timeout: The timeouts of each attempt. Defaults to the client's timeouts.
+        :type timeout: `Optional[Union[float,Tuple[float,float]]]`
+        :param deadline: The monotonic time by which the download must end, see `get`.
+        :type deadline: `Optional[float]`
+        :return: The raw bytes of the response.
+        :rtype: `bytes`
+        :raises requests.HTTPError: if the final response is not successful.
+        """
+        response = self.get(url,timeout,deadline)
+        response.raise_for_status()
+        return response.content
+
+CLIENT = HttpClient()
@@ -0,0 +1,136 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from bs4 import BeautifulSoup
+from ..events import DataEvent
+from ..net import Deadline, DeadlineExceeded
+from ..nebutil.log import LOGGER
+
+IO_WORKERS = 8
+
+def _warmUp():
+    # Pays the bs4/html5lib import and first-parse cost once per worker process
+    BeautifulSoup('<html><body><p></p></body></html>','html5lib').decompose()
+
+def _ready():
+    return os.getpid()
+
+def _fetchBefore(fetch:Callable[[str],bytes],url:str,deadline:Deadline) -> bytes:
+    # The queued fetches that the cancellation missed give up without touching the network
+    if deadline.expired:
+        raise DeadlineExceeded(f"Deadline exceeded before fetching {url}")
+    return fetch(url)
+
+def extractContent(eventType:str,page:bytes) -> Dict[str,Any]:
+    """
+    Parses a detail page and extracts the content of its event.
+    Runs in a worker process: only the raw page goes in and only the small content dictionary comes back.
+    """
+    return DataEvent.contentFromPage(eventType,page)
+
+class ParsePool:
+    """
+    Fetches detail pages on a thread pool and parses them on a pool of warm worker processes.
+
+    html5lib parsing is CPU-bound pure Python, so it only scales across processes; network I/O stays on threads in the main process.
+
+    :param workers: The number of parsing processes. Defaults to the number of CPUs. `0` parses in the current process.
+    :type workers: `Optional[int]`
+    :param ioWorkers: The number of fetching threads.
+    :type ioWorkers: `int`
+    :param warm: Whether to spawn every parsing process right away, so that they warm up while the listing is processed. Otherwise they are only spawned by `collect`, no more than there are events to parse, and not at all if there are none.
+    :type warm: `bool`
+    """
+
+    def __init__(self,workers:Optional[int]=None,ioWorkers:int=IO_WORKERS,warm=True) -> None:
+        self.__workers = (os.cpu_count() or 1) if workers is None else workers
+        self.__io = ThreadPoolExecutor(max_workers=ioWorkers,thread_name_prefix='fetch')
+        self.__cpu = None
+        # Set when tasks were given up while still running, so that leaving the pool does not wait for them
+        self.__abandoned = False
+        if warm and self.__workers > 0:
+            self.__start(self.__workers)
+
+    def __start(self,processes:int):
+        self.__cpu = ProcessPoolExecutor(max_workers=processes,initializer=_warmUp)
+        for _ in range(processes):
+            self.__cpu.submit(_ready)
+
+    @property
+    def workers(self):
+        return self.__workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*_):
+        self.shutdown()
+
+    def shutdown(self):
+        wait = not self.__abandoned
+        self.__io.shutdown(wait=wait,cancel_futures=True)
+        if self.__cpu is not None:
+            self.__cpu.shutdown(wait=wait,cancel_futures=True)
+
+    def __parse(self,eventType:str,page:bytes) -> Future:
+        if self.__workers == 0:
+            future = Future()
+            try:
+                future.set_result(extractContent(eventType,page))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self.__cpu.submit(extractContent,eventType,page)
+
+    def collect(self,headers:List[Dict[str,Any]],fetch:Callable[[str],bytes],deadline:Optional[Deadline]=None) -> Tuple[Dict[str,DataEvent],Dict[str,str]]:
+        """
+        Fetches, parses and builds the events described by listing headers, giving up on the events that fail or are not done by the deadline.
+
+        A failing fetch or parse only loses its own event. Once the deadline has passed, the pending fetches and parses are cancelled and the running ones abandoned: leaving the pool does not wait for them.
+        A fetch that had not started by the deadline fails without calling `fetch`; `fetch` should itself give up at the deadline, since the interpreter still waits for the running fetching threads when it exits.
+
+        :param headers: The events headers, as returned by `DataEvent.headerFromSoup`.
+        :type headers: `List[Dict[str,Any]]`
+        :param fetch: The function downloading the raw bytes of a URL.
+        :type fetch: `Callable[[str],bytes]`
+        :param deadline: The deadline of the whole collection. Never expires if `None`.
+        :type deadline: `Optional[Deadline]`
+        :return: The built events by URL, and the reason of each failure by URL.
+        :rtype: `tuple[Dict[str,DataEvent],Dict[str,str]]`
+        """
+        deadline = deadline or Deadline()
+        if self.__cpu is None and self.__workers > 0 and headers:
+            self.__start(min(self.__workers,len(headers)))
+        pages = {self.__io.submit(_fetchBefore,fetch,header['url'],deadline): header for header in headers}
+        contents:Dict[Future,Dict[str,Any]] = {}
+        failed:Dict[str,str] = {}
+        try:
+            for page in as_completed(pages,timeout=deadline.remaining):
+                header = pages[page]
+                try:
+                    contents[self.__parse(header['eventType'],page.result())] = header
+                except Exception as e:
+                    failed[header['url']] = f"fetch failed: {e.__class__.__name__}: {e}"
+        except TimeoutError:
+            pass
+        events:Dict[str,DataEvent] = {}
+        try:
+            for content in as_completed(contents,timeout=deadline.remaining):
+                header = contents[content]
+                try:
+                    events[header['url']] = DataEvent(content=content.result(),**header)
+                except Exception as e:
+                    failed[header['url']] = f"parsing failed: {e.__class__.__name__}: {e}"
+        except TimeoutError:
+            pass
+        parsing = {header['url'] for header in contents.values()}
+        for futures,step in ((pages,'fetching'),(contents,'parsing')):
+            for future,header in futures.items():
+                url = header['url']
+                if url in events or url in failed or (step == 'fetching' and url in parsing):
+                    continue
+                failed[url] = f"timed out while {step}"
+                if not future.cancel() and not future.done():
+                    self.__abandoned = True
+        LOGGER.info(f"Collected {len(events)} of {len(headers)} events" + (f", {len(failed)} failed or timed out." if failed else "."))
+        return events, failed
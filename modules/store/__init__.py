@@ -0,0 +1,421 @@
+import json, os, threading, uuid
+from typing import Any, Dict, List, Optional, Tuple
+from ..events import DataEvent, DataEventCollection
+from ..nebutil.log import LOGGER
+
+class Op:
+    BASE = 'base'
+    UPSERT = 'upsert'
+    REMOVE = 'remove'
+    META = 'meta'
+
+def dumps(value:Any) -> str:
+    return json.dumps(value,ensure_ascii=False)
+
+def dumpRecords(items:List[Dict[str,Any]],freshness:Dict[str,Dict[str,Any]],nextUpdate:float,listingChecked:Optional[float]=None,journal:Optional[str]=None) -> str:
+    """
+    Encodes encoded events and their freshness records to the data file format, with one event or freshness record per line.
+
+    :param items: The events, as encoded by the event codec.
+    :type items: `list[Dict[str,Any]]`
+    :param freshness: The freshness records by URL. Records of URLs that are not in `items` are left out.
+    :type freshness: `Dict[str,Dict[str,Any]]`
+    :param nextUpdate: The timestamp of the next update.
+    :type nextUpdate: `float`
+    :param listingChecked: The timestamp of the last fetch of the listing.
+    :type listingChecked: `Optional[float]`
+    :param journal: The identifier of the journal continuing this snapshot, see `EventStore`.
+    :type journal: `Optional[str]`
+    :rtype: `str`
+    """
+    block = lambda lines,indent,brackets: f'{brackets[0]}\n' + ',\n'.join(lines) + f'\n{indent}{brackets[1]}' if lines else brackets
+    records = block([f'        {dumps(item["url"])}: {dumps(freshness[item["url"]])}' for item in items if item['url'] in freshness],'    ','{}')
+    events = block([f'            {dumps(item)}' for item in items],'        ','[]')
+    return (
+        '{\n'
+        f'    "nextUpdate": {dumps(nextUpdate)},\n'
+        f'    "listingChecked": {dumps(listingChecked)},\n'
+        + (f'    "journal": {dumps(journal)},\n' if journal else '') +
+        f'    "freshness": {records},\n'
+        f'    "events": {{\n        "items": {events}\n    }}\n'
+        '}\n'
+    )
+
+def dumpState(state:Dict[str,Any]) -> str:
+    """
+    Encodes a state to the data file format, with one event or freshness record per line.
+    Each line is encoded by the C JSON encoder from the dictionaries of the compiled event codec.
+
+    :param state: The state, in the format of `EventStore.read`.
+    :type state: `Dict[str,Any]`
+    :rtype: `str`
+    """
+    codec = DataEvent.codec()
+    return dumpRecords([codec.encode(ev) for ev in state['events']],state.get('freshness') or {},state['nextUpdate'],state.get('listingChecked'))
+
+def parseState(text:str) -> Dict[str,Any]:
+    """
+    Decodes a state from the data file format.
+
+    :param text: The content of the data file.
+    :type text: `str`
+    :return: The state, in the format of `EventStore.read`.
+    :rtype: `Dict[str,Any]`
+    """
+    data = json.loads(text)
+    return {
+        'events': DataEventCollection.codec().decode(data['events']),
+        'nextUpdate': data['nextUpdate'],
+        'freshness': data.get('freshness') or {},
+        'listingChecked': data.get('listingChecked')
+    }
+
+class EventStore:
+    """
+    Stores the events as a snapshot, the data file, followed by an append-only journal of the changes made since.
+
+    Each commit appends one line per added, updated or removed event, then a `meta` line closing the commit, and syncs the journal once. Writes are proportional to the changes rather than to the number of events.
+    Readers rebuild the state from the snapshot and the commits of the journal. A commit that is not closed, e.g. a truncated last line after a crash, is ignored.
+    Once the journal holds `compactAfter` operations, it is compacted in a background thread: a new snapshot replaces the data file atomically and the journal starts over.
+    The journal starts with the identifier of the snapshot it continues, so a journal left behind by a crash during compaction, or by a snapshot written by other means, is never replayed over a newer snapshot.
+
+    :param path: The path of the snapshot.
+    :type path: `str`
+    :param journal: The path of the journal. Defaults to `path` with a `.journal` extension.
+    :type journal: `Optional[str]`
+    :param compactAfter: The number of journal operations triggering a compaction.
+    :type compactAfter: `int`
+    """
+
+    def __init__(self,path:str="events.json",journal:Optional[str]=None,compactAfter:int=500) -> None:
+        self.__path = path
+        self.__journal = journal or f'{os.path.splitext(path)[0]}.journal'
+        self.__compactAfter = compactAfter
+        self.__lock = threading.Lock()
+        self.__compaction:Optional[threading.Thread] = None
+        self.__loaded = False
+        self.__items:Dict[str,Dict[str,Any]] = {}
+        self.__freshness:Dict[str,Dict[str,Any]] = {}
+        self.__meta:Dict[str,Any] = {'nextUpdate': None, 'listingChecked': None}
+        self.__snapshotId:Optional[str] = None
+        self.__journalId:Optional[str] = None
+        self.__journalOps = 0
+        self.__journalEnd = 0
+        # The commit started by `begin`
+        self.__file = None
+        self.__written:Optional[Dict[str,None]] = None
+        self.__pendingOps = 0
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def journal(self):
+        return self.__journal
+
+    def exists(self) -> bool:
+        """
+        Returns whether a snapshot was saved.
+
+        :rtype: `bool`
+        """
+        return os.path.exists(self.__path) and os.path.getsize(self.__path) > 0
+
+    def __readJournal(self) -> Tuple[Optional[str],List[List[Dict[str,Any]]],int]:
+        if not os.path.exists(self.__journal):
+            return None, [], 0
+        base = None
+        commits, pending = [], []
+        offset = end = 0
+        with open(self.__journal,'rb') as f:
+            for line in f:
+                offset += len(line)
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # Only the last line can be partially written, and the commit it belongs to is not closed
+                    LOGGER.warning(f"Ignoring a truncated line in {self.__journal}.")
+                    break
+                if op['op'] == Op.BASE:
+                    base = op['snapshot']
+                    end = offset
+                    continue
+                pending.append(op)
+                if op['op'] == Op.META:
+                    commits.append(pending)
+                    pending = []
+                    end = offset
+        if pending:
+            LOGGER.warning(f"Ignoring an unfinished commit of {len(pending)} operations in {self.__journal}.")
+        return base, commits, end
+
+    def __load(self):
+        with open(self.__path,'r',encoding='utf-8') as f:
+            data = json.load(f)
+        self.__items = {item['url']: item for item in data['events']['items']}
+        self.__freshness = dict(data.get('freshness') or {})
+        self.__meta = {'nextUpdate': data['nextUpdate'], 'listingChecked': data.get('listingChecked')}
+        self.__snapshotId = data.get('journal')
+        base, commits, end = self.__readJournal()
+        self.__journalId = None
+        self.__journalOps = 0
+        if base is None or base != self.__snapshotId:
+            if commits:
+                LOGGER.info(f"Ignoring {self.__journal}, it does not continue the current snapshot.")
+        else:
+            self.__journalId = base
+            self.__journalEnd = end
+            for commit in commits:
+                self.__apply(commit)
+                self.__journalOps += len(commit)
+        self.__loaded = True
+
+    def __apply(self,ops:List[Dict[str,Any]]):
+        for op in ops:
+            if op['op'] == Op.UPSERT:
+                url = op['event']['url']
+                self.__items[url] = op['event']
+                if 'freshness' in op:
+                    self.__freshness[url] = op['freshness']
+            elif op['op'] == Op.REMOVE:
+                self.__items.pop(op['url'],None)
+                self.__freshness.pop(op['url'],None)
+            elif op['op'] == Op.META:
+                self.__meta = {'nextUpdate': op['nextUpdate'], 'listingChecked': op['listingChecked']}
+
+    def read(self) -> Dict[str,Any]:
+        """
+        Reads the snapshot and the journal.
+
+        :return: The saved state, with the `events` sorted by start date, the `nextUpdate` timestamp, the `freshness` records of the events by URL and the `listingChecked` timestamp.
+        :rtype: `Dict[str,Any]`
+        """
+        with self.__lock:
+            self.__load()
+            codec = DataEvent.codec()
+            events = DataEventCollection([codec.decode(item) for item in self.__items.values()])
+            return {
+                'events': events.sort(lambda ev: ev.startDateTimestamp,False),
+                'nextUpdate': self.__meta['nextUpdate'],
+                'freshness': {url: record for url,record in self.__freshness.items() if url in self.__items},
+                'listingChecked': self.__meta['listingChecked']
+            }
+
+    def __op(self,item:Dict[str,Any],record:Optional[Dict[str,Any]]) -> Optional[Dict[str,Any]]:
+        url = item['url']
+        if self.__items.get(url) == item and (record is None or self.__freshness.get(url) == record):
+            return None
+        op = {'op': Op.UPSERT, 'event': item}
+        if record is not None:
+            op['freshness'] = record
+        return op
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*_):
+        if self.__written is not None:
+            self.abort()
+
+    def begin(self):
+        """
+        Starts a commit written one event at a time: `write` journals each event as it comes, and `finish` removes the events that were not written, closes the commit and syncs the journal once.
+        Written events are not kept, only their encoded items, like the rest of the stored state. The store is locked until `finish` or `abort`.
+        Used as a context manager, leaving before `finish` aborts the commit.
+
+        :return: The store.
+        :rtype: `EventStore`
+        """
+        self.join()
+        self.__lock.acquire()
+        try:
+            if not self.exists():
+                self.__items, self.__freshness = {}, {}
+                self.__loaded = True
+            elif not self.__loaded:
+                self.__load()
+            # Without a snapshot to continue, the commit is written as a new snapshot by `finish`
+            self.__file = None
+            if self.__snapshotId is not None:
+                if self.__journalId and os.path.getsize(self.__journal) > self.__journalEnd:
+                    # Drop the end of an unfinished commit so that the next one starts on a new line
+                    os.truncate(self.__journal,self.__journalEnd)
+                self.__file = open(self.__journal,'a' if self.__journalId else 'w',encoding='utf-8')
+                if not self.__journalId:
+                    self.__file.write(dumps({'op': Op.BASE, 'snapshot': self.__snapshotId}) + '\n')
+        except BaseException:
+            self.__loaded = False
+            self.__lock.release()
+            raise
+        self.__written = {}
+        self.__pendingOps = 0
+        return self
+
+    def __append(self,op:Dict[str,Any]):
+        if self.__file is not None:
+            self.__file.write(dumps(op) + '\n')
+        self.__apply([op])
+        self.__pendingOps += 1
+
+    def write(self,event:DataEvent,record:Optional[Dict[str,Any]]=None):
+        """
+        Journals an event of the commit started by `begin`, if it differs from the stored one.
+
+        :param event: The event.
+        :type event: `DataEvent`
+        :param record: The freshness record of the event. The stored one is kept if `None`.
+        :type record: `Optional[Dict[str,Any]]`
+        """
+        item = DataEvent.codec().encode(event)
+        self.__written[item['url']] = None
+        op = self.__op(item,record)
+        if op is not None:
+            self.__append(op)
+
+    def keep(self,url:str) -> Optional[DataEvent]:
+        """
+        Keeps the stored event of a URL and its freshness record unchanged in the commit started by `begin`, e.g. when its page could not be fetched.
+
+        :param url: The URL of the event.
+        :type url: `str`
+        :return: The stored event, or `None` if there is none and nothing is kept.
+        :rtype: `Optional[DataEvent]`
+        """
+        if url not in self.__items:
+            return None
+        self.__written[url] = None
+        return DataEvent.codec().decode(self.__items[url])
+
+    def record(self,url:str) -> Optional[Dict[str,Any]]:
+        """
+        Returns the stored freshness record of an event, during a commit started by `begin`.
+
+        :param url: The URL of the event.
+        :type url: `str`
+        :rtype: `Optional[Dict[str,Any]]`
+        """
+        return self.__freshness.get(url) if url in self.__items else None
+
+    def finish(self,nextUpdate:float,listingChecked:Optional[float]=None) -> int:
+        """
+        Ends the commit started by `begin`: removes the stored events that were not written, then closes the commit and syncs the journal.
+
+        :param nextUpdate: The timestamp of the next update.
+        :type nextUpdate: `float`
+        :param listingChecked: The timestamp of the last fetch of the listing.
+        :type listingChecked: `Optional[float]`
+        :return: The number of added, updated or removed events.
+        :rtype: `int`
+        """
+        try:
+            for url in self.__items.keys() - self.__written.keys():
+                self.__append({'op': Op.REMOVE, 'url': url})
+            self.__append({'op': Op.META, 'nextUpdate': nextUpdate, 'listingChecked': listingChecked})
+            # The items follow the order of the last committed state
+            self.__items = {url: self.__items[url] for url in self.__written}
+            changes = self.__pendingOps - 1
+            if self.__file is None:
+                self.__compact()
+            else:
+                self.__file.flush()
+                os.fsync(self.__file.fileno())
+                self.__journalEnd = os.fstat(self.__file.fileno()).st_size
+                self.__file.close()
+        except BaseException:
+            self.abort()
+            raise
+        journaled = self.__file is not None
+        self.__written = None
+        if journaled:
+            self.__journalId = self.__snapshotId
+            self.__journalOps += self.__pendingOps
+        compact = self.__journalOps >= self.__compactAfter
+        self.__lock.release()
+        if journaled:
+            LOGGER.info(f"Journaled {changes} changes, {self.__journalOps} operations since the last snapshot.")
+        if compact:
+            self.compact(wait=False)
+        return changes
+
+    def abort(self):
+        """
+        Drops the commit started by `begin`. Its operations stay unfinished in the journal, and are ignored by readers and truncated by the next commit.
+        """
+        try:
+            if self.__file is not None and not self.__file.closed:
+                self.__file.close()
+        finally:
+            # Read the files again on the next commit rather than trusting the state in memory
+            self.__loaded = False
+            self.__written = None
+            self.__lock.release()
+
+    def commit(self,state:Dict[str,Any]) -> int:
+        """
+        Appends the changes from the stored state to the given state to the journal, and syncs it once.
+        A snapshot is written first if there is none yet, or if the current one cannot be continued by a journal.
+
+        :param state: The new state, in the format of `read`.
+        :type state: `Dict[str,Any]`
+        :return: The number of added, updated or removed events.
+        :rtype: `int`
+        """
+        freshness = state.get('freshness') or {}
+        with self.begin():
+            for ev in state['events']:
+                self.write(ev,freshness.get(ev.url))
+            return self.finish(state['nextUpdate'],state.get('listingChecked'))
+
+    def __compact(self):
+        snapshotId = uuid.uuid4().hex
+        tmp = f'{self.__path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp,'w',encoding='utf-8') as f:
+                f.write(dumpRecords(list(self.__items.values()),self.__freshness,self.__meta['nextUpdate'],self.__meta['listingChecked'],snapshotId))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp,self.__path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        # The old journal is ignored from now on, since it does not continue the new snapshot
+        if os.path.exists(self.__journal):
+            os.remove(self.__journal)
+        self.__snapshotId = snapshotId
+        self.__journalId = None
+        self.__journalOps = 0
+
+    def __compactLocked(self):
+        with self.__lock:
+            try:
+                self.__compact()
+                LOGGER.info(f"Compacted the journal into {self.__path}.")
+            except Exception as e:
+                LOGGER.error(f"Error while compacting the journal, it is kept: {e}")
+
+    def compact(self,wait=True):
+        """
+        Writes a new snapshot of the stored state and starts a new journal.
+        Commits wait for a running compaction to finish.
+
+        :param wait: Whether to wait for the compaction rather than running it in a background thread.
+        :type wait: `bool`
+        """
+        self.join()
+        if not self.__loaded:
+            with self.__lock:
+                self.__load()
+        self.__compaction = threading.Thread(target=self.__compactLocked,name='event-store-compaction')
+        self.__compaction.start()
+        if wait:
+            self.join()
+
+    def join(self):
+        """
+        Waits for the running compaction, if any.
+        """
+        if self.__compaction is not None:
+            self.__compaction.join()
+            self.__compaction = None
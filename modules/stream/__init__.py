@@ -0,0 +1,115 @@
+import os, sys
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from ..events import DataEvent
+from ..ics import icsEvent
+from ..net import Deadline
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peakRss() -> Optional[int]:
+    """
+    Returns the peak resident set size of the current process.
+
+    :return: The peak RSS in bytes, or `None` if the platform does not report it.
+    :rtype: `Optional[int]`
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def currentRss() -> Optional[int]:
+    """
+    Returns the current resident set size of the current process.
+
+    :return: The current RSS in bytes, or `None` if the platform does not report it.
+    :rtype: `Optional[int]`
+    """
+    try:
+        with open('/proc/self/statm','r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError,ValueError,IndexError):
+        return None
+
+def formatBytes(size:Optional[int]) -> str:
+    if size is None:
+        return '?'
+    return f"{size / 2 ** 20:.1f} MiB"
+
+def iterEvents(headers:Iterable[Dict[str,Any]],fetch:Callable[[str],bytes],deadline:Optional[Deadline]=None) -> Iterator[Tuple[Dict[str,Any],Optional[DataEvent],Optional[str]]]:
+    """
+    Fetches and parses events one at a time.
+    Only one detail page and its tree are alive at any time: the page is dropped and the tree decomposed as soon as the content is extracted.
+    A failing fetch or parse only loses its own event, and the events left once the deadline has passed are not fetched.
+
+    :param headers: The events headers, as returned by `DataEvent.headerFromSoup`.
+    :type headers: `Iterable[Dict[str,Any]]`
+    :param fetch: The function downloading the raw bytes of a URL.
+    :type fetch: `Callable[[str],bytes]`
+    :param deadline: The deadline of the whole iteration. Never expires if `None`.
+    :type deadline: `Optional[Deadline]`
+    :return: The header of each event, with either the event or the reason of its failure.
+    :rtype: `Iterator[tuple[Dict[str,Any],Optional[DataEvent],Optional[str]]]`
+    """
+    deadline = deadline or Deadline()
+    for header in headers:
+        if deadline.expired:
+            yield header, None, "timed out while fetching"
+            continue
+        try:
+            page = fetch(header['url'])
+        except Exception as e:
+            yield header, None, f"fetch failed: {e.__class__.__name__}: {e}"
+            continue
+        try:
+            content = DataEvent.contentFromPage(header['eventType'],page)
+        except Exception as e:
+            yield header, None, f"parsing failed: {e.__class__.__name__}: {e}"
+            continue
+        yield header, DataEvent(content=content,**header), None
+
+class AtomicWriter:
+    """
+    Writes a file through a temporary file that only replaces the target when `close` is called.
+    Leaving the context without closing, e.g. on an exception, discards the temporary file and keeps the target intact.
+    """
+
+    def __init__(self,path:str) -> None:
+        self._path = path
+        self._tmp = f'{path}.{os.getpid()}.tmp'
+        self._file = open(self._tmp,'w',encoding='utf-8',newline='')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*_):
+        if not self._file.closed:
+            self._file.close()
+            os.remove(self._tmp)
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp,self._path)
+
+class CalendarWriter(AtomicWriter):
+    """
+    Writes the calendar file one VEVENT at a time.
+    Weekly series are not compressed since it would require every event at once.
+    """
+
+    def __init__(self,path:str) -> None:
+        super().__init__(path)
+        self._file.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//pokemongo-calendar//LeekDuck events//EN\r\n')
+
+    def write(self,event:DataEvent):
+        self._file.write(icsEvent(event).to_ical().decode('utf-8'))
+
+    def finish(self):
+        self._file.write('END:VCALENDAR\r\n')
+        self.close()
@@ -0,0 +1,195 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from ..nebutil.time import DateUtil
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+class Timeline:
+    """
+    Vectorized analytics over the start/end timestamps of a collection of events.
+
+    The timestamps are loaded once into NumPy arrays; every query is then computed with sorting and binary searches instead of Python loops.
+    Bucket edges are aligned on the local midnight preceding the earliest event unless an explicit `origin` is given.
+
+    :param events: The events to analyse.
+    :type events: `Iterable[DataEvent]`
+    """
+
+    def __init__(self,events:Iterable) -> None:
+        events = list(events)
+        self.__starts = np.fromiter((ev.startDateTimestamp for ev in events),dtype=np.float64,count=len(events))
+        self.__ends = np.fromiter((ev.endDateTimestamp for ev in events),dtype=np.float64,count=len(events))
+        self.__types, self.__typeCodes = np.unique(np.array([ev.eventType for ev in events],dtype=str),return_inverse=True)
+        # Single-instant events (no end date) still occupy their starting second
+        self.__ends = np.maximum(self.__ends,self.__starts + 1)
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.__starts
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self.__ends
+
+    @property
+    def types(self) -> List[str]:
+        return [str(t) for t in self.__types]
+
+    def __len__(self) -> int:
+        return len(self.__starts)
+
+    def __mask(self,types:Optional[Sequence[str]]):
+        if types is None:
+            return np.ones(len(self),dtype=bool)
+        return np.isin(self.__types[self.__typeCodes],list(types))
+
+    def edges(self,bucket:float=HOUR,start:Optional[float]=None,end:Optional[float]=None,origin:Optional[float]=None) -> np.ndarray:
+        """
+        Computes the bucket edges covering a time window.
+
+        :param bucket: The size of a bucket in seconds.
+        :type bucket: `float`
+        :param start: The start timestamp of the window. Defaults to the earliest event start.
+        :type start: `Optional[float]`
+        :param end: The end timestamp of the window. Defaults to the latest event end.
+        :type end: `Optional[float]`
+        :param origin: A timestamp on which the edges are aligned. Defaults to the local midnight before `start`.
+        :type origin: `Optional[float]`
+        :return: The edges of the buckets, one more than the number of buckets.
+        :rtype: `np.ndarray`
+        """
+        if len(self) == 0 and (start is None or end is None):
+            return np.array([],dtype=np.float64)
+        start = float(self.__starts.min()) if start is None else start
+        end = float(self.__ends.max()) if end is None else end
+        if origin is None:
+            day = DateUtil.fromTimestamp(start).date
+            origin = datetime(day.year,day.month,day.day).timestamp()
+        first = origin + np.floor((start - origin) / bucket) * bucket
+        count = max(int(np.ceil((end - first) / bucket)),1)
+        return first + np.arange(count + 1,dtype=np.float64) * bucket
+
+    @staticmethod
+    def _overlapping(starts:np.ndarray,ends:np.ndarray,lows:np.ndarray,highs:np.ndarray) -> np.ndarray:
+        # Number of intervals [starts,ends) overlapping each window [lows,highs)
+        return np.searchsorted(np.sort(starts),highs,'left') - np.searchsorted(np.sort(ends),lows,'right')
+
+    def concurrency(self,bucket:float=HOUR,start:Optional[float]=None,end:Optional[float]=None,types:Optional[Sequence[str]]=None,origin:Optional[float]=None) -> Tuple[np.ndarray,np.ndarray]:
+        """
+        Computes how many events overlap each bucket of a time window.
+
+        :param bucket: The size of a bucket in seconds. Defaults to one hour.
+        :type bucket: `float`
+        :param start: The start timestamp of the window.
+        :type start: `Optional[float]`
+        :param end: The end timestamp of the window.
+        :type end: `Optional[float]`
+        :param types: The event types to count. Defaults to every type.
+        :type types: `Optional[Sequence[str]]`
+        :param origin: A timestamp on which the buckets are aligned.
+        :type origin: `Optional[float]`
+        :return: The start timestamp of each bucket and the number of events overlapping it.
+        :rtype: `tuple[np.ndarray,np.ndarray]`
+        """
+        edges = self.edges(bucket,start,end,origin)
+        if len(edges) == 0:
+            return edges, np.array([],dtype=np.intp)
+        mask = self.__mask(types)
+        counts = Timeline._overlapping(self.__starts[mask],self.__ends[mask],edges[:-1],edges[1:])
+        return edges[:-1], counts
+
+    def density(self,bucket:float=DAY,start:Optional[float]=None,end:Optional[float]=None,origin:Optional[float]=None) -> Tuple[np.ndarray,Dict[str,np.ndarray]]:
+        """
+        Computes the concurrency histogram of each event type on shared buckets.
+
+        :param bucket: The size of a bucket in seconds. Defaults to one day.
+        :type bucket: `float`
+        :return: The start timestamp of each bucket and, for each event type, the number of events overlapping it.
+        :rtype: `tuple[np.ndarray,Dict[str,np.ndarray]]`
+        """
+        edges = self.edges(bucket,start,end,origin)
+        if len(edges) == 0:
+            return edges, {}
+        result = {}
+        for code, eventType in enumerate(self.__types):
+            mask = self.__typeCodes == code
+            result[str(eventType)] = Timeline._overlapping(self.__starts[mask],self.__ends[mask],edges[:-1],edges[1:])
+        return edges[:-1], result
+
+    def busiest(self,bucket:float=DAY,top:int=5,start:Optional[float]=None,end:Optional[float]=None) -> Dict[str,List[Tuple[float,int]]]:
+        """
+        Finds the busiest buckets (days by default) of each event type.
+
+        :param bucket: The size of a bucket in seconds. Defaults to one day.
+        :type bucket: `float`
+        :param top: The number of buckets to return per type.
+        :type top: `int`
+        :return: For each event type, the `(bucketStart, count)` pairs of its busiest buckets, busiest first.
+        :rtype: `Dict[str,list[tuple[float,int]]]`
+        """
+        edges, density = self.density(bucket,start,end)
+        result = {}
+        for eventType, counts in density.items():
+            order = np.argsort(-counts,kind='stable')[:top]
+            result[eventType] = [(float(edges[i]),int(counts[i])) for i in order if counts[i] > 0]
+        return result
+
+    def gaps(self,start:Optional[float]=None,end:Optional[float]=None,types:Optional[Sequence[str]]=None,minLength:float=0) -> np.ndarray:
+        """
+        Finds the free slots of a time window, during which no event of the given types is running.
+
+        :param start: The start timestamp of the window. Defaults to the earliest event start.
+        :type start: `Optional[float]`
+        :param end: The end timestamp of the window. Defaults to the latest event end.
+        :type end: `Optional[float]`
+        :param types: The event types occupying time, e.g. `EventType.raids()`. Defaults to every type.
+        :type types: `Optional[Sequence[str]]`
+        :param minLength: The minimum length of a slot in seconds.
+        :type minLength: `float`
+        :return: An `(n,2)` array of the `[start,end)` timestamps of each free slot.
+        :rtype: `np.ndarray`
+        """
+        mask = self.__mask(types)
+        starts, ends = self.__starts[mask], self.__ends[mask]
+        start = (float(starts.min()) if len(starts) else 0.) if start is None else start
+        end = (float(ends.max()) if len(ends) else 0.) if end is None else end
+        order = np.argsort(starts,kind='stable')
+        starts, ends = starts[order], ends[order]
+        # Busy time covered so far before each event: running maximum of the previous ends
+        covered = np.maximum.accumulate(np.concatenate(([start],ends)))
+        gapStarts = covered[:-1]
+        gapEnds = starts
+        slots = np.column_stack((np.append(gapStarts,covered[-1]),np.append(gapEnds,end)))
+        slots[:,0] = np.maximum(slots[:,0],start)
+        slots[:,1] = np.minimum(slots[:,1],end)
+        return slots[slots[:,1] - slots[:,0] > max(minLength,0)]
+
+    def overlapMatrix(self) -> Tuple[List[str],np.ndarray]:
+        """
+        Counts the pairs of overlapping events between each pair of event types.
+
+        :return: The event types and a symmetric matrix whose cell `[i][j]` is the number of unordered overlapping pairs made of an event of type `i` and an event of type `j`. Events are not counted as overlapping themselves.
+        :rtype: `tuple[list[str],np.ndarray]`
+        """
+        n = len(self.__types)
+        matrix = np.zeros((n,n),dtype=np.int64)
+        for j in range(n):
+            mask = self.__typeCodes == j
+            # Number of type j events overlapping each event
+            counts = Timeline._overlapping(self.__starts[mask],self.__ends[mask],self.__starts,self.__ends)
+            counts = counts - mask
+            matrix[:,j] = np.bincount(self.__typeCodes,weights=counts,minlength=n).astype(np.int64)
+        # Within a type, each pair was counted from both of its events
+        matrix[np.diag_indices(n)] //= 2
+        return self.types, matrix
+
+    @staticmethod
+    def toDatetimes(timestamps:np.ndarray) -> List[datetime]:
+        """
+        Converts bucket timestamps to local `datetime` objects, e.g. for chart labels.
+
+        :rtype: `list[datetime]`
+        """
+        return [DateUtil.fromTimestamp(float(t)).date for t in timestamps]
@@ -0,0 +1,216 @@
+import os
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from ..events import DataEvent
+from ..ics import icsEvent, eventStart, eventEnd
+
+DAY = 24 * 3600
+EPOCH = datetime(1970,1,1)
+ICS_DATE_FORMAT = '%Y%m%dT%H%M%S'
+PRODID = '-//pokemongo-calendar//LeekDuck events//EN'
+
+class OffsetTable:
+    """
+    The UTC offsets of a timezone over a range of timestamps, computed once.
+
+    The range is scanned day by day and every change of offset is located to the second by bisection. Converting a timestamp is then a binary search in the transitions, without going through `tzinfo`.
+
+    :param zone: The timezone.
+    :type zone: `ZoneInfo`
+    :param start: The first timestamp of the range.
+    :type start: `float`
+    :param end: The last timestamp of the range.
+    :type end: `float`
+    """
+
+    def __init__(self,zone:ZoneInfo,start:float,end:float) -> None:
+        self.__zone = zone
+        self.__start = start
+        # Transition i switches from offsets[i] to offsets[i + 1]
+        self.__transitions:List[float] = []
+        self.__offsets:List[int] = [self.__offsetAt(start)]
+        t = start
+        while t < end:
+            nextT = min(t + DAY,end)
+            if self.__offsetAt(nextT) != self.__offsets[-1]:
+                low, high = t, nextT
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self.__offsetAt(middle) == self.__offsets[-1]:
+                        low = middle
+                    else:
+                        high = middle
+                self.__transitions.append(high)
+                self.__offsets.append(self.__offsetAt(high))
+            t = nextT
+
+    def __offsetAt(self,epoch:float) -> int:
+        return int(datetime.fromtimestamp(epoch,self.__zone).utcoffset().total_seconds())
+
+    @property
+    def zone(self):
+        return self.__zone
+
+    @property
+    def transitions(self) -> List[float]:
+        return self.__transitions
+
+    def offset(self,epoch:float) -> int:
+        """
+        Returns the UTC offset at a timestamp, in seconds.
+
+        :rtype: `int`
+        """
+        return self.__offsets[bisect_right(self.__transitions,epoch)]
+
+    def wall(self,epoch:float) -> datetime:
+        """
+        Returns the wall clock time of the timezone at a timestamp.
+
+        :rtype: `datetime`
+        """
+        return EPOCH + timedelta(seconds=epoch + self.offset(epoch))
+
+    def observances(self) -> List[Tuple[datetime,int,int,str,bool]]:
+        """
+        Returns the observances of the range: the initial one, then one per transition.
+
+        :return: The local start, the offsets before and after, the abbreviation and whether it is daylight saving time, for each observance.
+        :rtype: `list[tuple[datetime,int,int,str,bool]]`
+        """
+        starts = [self.__start] + self.__transitions
+        observances = []
+        for index,epoch in enumerate(starts):
+            before = self.__offsets[max(index - 1,0)]
+            after = self.__offsets[index]
+            local = datetime.fromtimestamp(epoch,self.__zone)
+            observances.append((EPOCH + timedelta(seconds=epoch + before),before,after,local.tzname(),bool(local.dst())))
+        return observances
+
+def formatOffset(seconds:int) -> str:
+    sign = '-' if seconds < 0 else '+'
+    hours, minutes = divmod(abs(seconds) // 60,60)
+    return f'{sign}{hours:02d}{minutes:02d}'
+
+def vtimezone(table:OffsetTable) -> bytes:
+    """
+    Builds the VTIMEZONE component of a timezone from its offset table.
+
+    :param table: The offset table of the timezone.
+    :type table: `OffsetTable`
+    :rtype: `bytes`
+    """
+    lines = ['BEGIN:VTIMEZONE',f'TZID:{table.zone.key}']
+    for local,before,after,name,dst in table.observances():
+        kind = 'DAYLIGHT' if dst else 'STANDARD'
+        lines += [
+            f'BEGIN:{kind}',
+            f'DTSTART:{local.strftime(ICS_DATE_FORMAT)}',
+            f'TZOFFSETFROM:{formatOffset(before)}',
+            f'TZOFFSETTO:{formatOffset(after)}',
+            f'TZNAME:{name}',
+            f'END:{kind}'
+        ]
+    lines.append('END:VTIMEZONE')
+    return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+def storedEpoch(date:str,zone:ZoneInfo) -> float:
+    """
+    Returns the timestamp of a stored event date, read as a wall clock time of a timezone.
+
+    :param date: The date, in the `DataEvent.ALTERNATE_DATE_FORMAT` format.
+    :type date: `str`
+    :param zone: The timezone the date is stored in.
+    :type zone: `ZoneInfo`
+    :rtype: `float`
+    """
+    return datetime.strptime(date,DataEvent.ALTERNATE_DATE_FORMAT).replace(tzinfo=zone).timestamp()
+
+class ZoneRenderer:
+    """
+    Renders the calendar of the events for several timezones.
+
+    Everything that does not depend on the timezone is prepared once: each VEVENT is serialized without its dates, and the timestamps of the global events are computed.
+    Rendering a timezone then only computes the offset table of the timezone over the range of the events and formats two dates per event.
+    Local time events keep their wall clock time in every timezone. Global events are converted to the wall clock time of each timezone.
+    The dates of global events are stored without offset: `DataEvent.normalizeDate` converts them to the local timezone of the scraping machine. They are read back in `LOCAL_TZ` unless `sourceZone` is given, which is required to render a data file scraped in another timezone.
+    Weekly series are not compressed, since a global series may not recur at the same local time across daylight saving time changes.
+
+    :param events: The events.
+    :type events: `Iterable[DataEvent]`
+    :param sourceZone: The IANA name of the timezone the dates of the global events are stored in. Defaults to the local timezone of this machine.
+    :type sourceZone: `Optional[str]`
+    """
+
+    def __init__(self,events:Iterable[DataEvent],sourceZone:Optional[str]=None) -> None:
+        source = None if sourceZone is None else ZoneInfo(sourceZone)
+        self.__bodies:List[bytes] = []
+        # Wall clock times of the local time events, timestamps of the global ones
+        self.__local:List[Optional[Tuple[str,str]]] = []
+        self.__epochs:List[Optional[Tuple[float,float]]] = []
+        start, end = float('inf'), float('-inf')
+        for event in events:
+            component = icsEvent(event)
+            del component['dtstart']
+            del component['dtend']
+            self.__bodies.append(component.to_ical()[len(b'BEGIN:VEVENT\r\n'):])
+            if event.localtime:
+                self.__local.append((eventStart(event).strftime(ICS_DATE_FORMAT),eventEnd(event).strftime(ICS_DATE_FORMAT)))
+                self.__epochs.append(None)
+            else:
+                self.__local.append(None)
+                self.__epochs.append((event.startDateTimestamp,event.endDateTimestamp) if source is None else (storedEpoch(event.startDate,source),storedEpoch(event.endDate,source)))
+            start, end = min(start,event.startDateTimestamp), max(end,event.endDateTimestamp)
+        # The offset tables cover every event, with a margin for the offsets of the timezones
+        self.__range = (start - DAY,end + DAY) if self.__bodies else None
+
+    def __len__(self) -> int:
+        return len(self.__bodies)
+
+    def render(self,zone:str) -> bytes:
+        """
+        Renders the calendar of a timezone.
+
+        :param zone: The IANA name of the timezone, e.g. `Europe/Paris`.
+        :type zone: `str`
+        :rtype: `bytes`
+        """
+        tz = ZoneInfo(zone)
+        now = datetime.now(timezone.utc).timestamp()
+        start, end = self.__range or (now,now)
+        table = OffsetTable(tz,start,end)
+        parts = [
+            f'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{PRODID}\r\nX-WR-TIMEZONE:{zone}\r\n'.encode('utf-8'),
+            vtimezone(table)
+        ]
+        prefix = f'DTSTART;TZID={zone}:'
+        for body,local,epochs in zip(self.__bodies,self.__local,self.__epochs):
+            if local is None:
+                local = (table.wall(epochs[0]).strftime(ICS_DATE_FORMAT),table.wall(epochs[1]).strftime(ICS_DATE_FORMAT))
+            parts.append(f'BEGIN:VEVENT\r\n{prefix}{local[0]}\r\nDTEND;TZID={zone}:{local[1]}\r\n'.encode('utf-8'))
+            parts.append(body)
+        parts.append(b'END:VCALENDAR\r\n')
+        return b''.join(parts)
+
+    def write(self,zones:Iterable[str],directory:str='.',pattern:str='cal-{zone}.ics') -> Dict[str,str]:
+        """
+        Renders and writes the calendar of each timezone.
+
+        :param zones: The IANA names of the timezones.
+        :type zones: `Iterable[str]`
+        :param directory: The directory of the calendar files.
+        :type directory: `str`
+        :param pattern: The name of the calendar files, `{zone}` being replaced by the name of the timezone with `/` replaced by `_`.
+        :type pattern: `str`
+        :return: The path of the calendar file of each timezone.
+        :rtype: `Dict[str,str]`
+        """
+        paths = {}
+        for zone in zones:
+            path = os.path.join(directory,pattern.format(zone=zone.replace('/','_')))
+            with open(path,'wb') as f:
+                f.write(self.render(zone))
+            paths[zone] = path
+        return paths